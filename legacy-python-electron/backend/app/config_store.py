@@ -1,13 +1,42 @@
 import os
-import json
+import copy
+import functools
+import logging
+import queue
 import threading
 import time
 
+from .core.json_codec import dumps, loads
+
 _DEFAULT_BASE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config')
 MAX_VERSIONS = 20
+# save/set/append/delete are appended to the WAL; the full JSON is checkpointed once
+# mutations have been quiet for CHECKPOINT_DELAY seconds, but no later than
+# CHECKPOINT_MAX_DELAY after the first one or CHECKPOINT_EVERY mutations.
+CHECKPOINT_EVERY = 50
+CHECKPOINT_DELAY = 0.05
+CHECKPOINT_MAX_DELAY = 0.25
 
+# Serialises writers only. Readers never take it: they load the current
+# _snapshot reference (an atomic rebind) and treat it as immutable, and
+# writers publish changes by rebinding _snapshot to a path-copied config.
 _lock = threading.Lock()
 
+# (stat, cfg) for api_config.json (+ replayed WAL); stat is (path, st_mtime_ns, st_size).
+_snapshot = (None, None)
+# Mutations appended to the WAL since the last checkpoint; guarded by _lock.
+_pending = {"writes": 0, "timer": None, "queued": False, "first": 0.0, "last": 0.0}
+# Checkpoint requests for the background writer thread; a full queue means the
+# writer is stuck behind slow disk, and the caller checkpoints synchronously.
+_write_q = queue.Queue(maxsize=64)
+_writer = {"thread": None}
+# (versions_dir, version names newest-first); the tuple is rebound under _lock.
+_versions_cache = (None, ())
+# (cfg, {key: value}) for get(); only valid while cfg is still the published snapshot.
+_get_memo = (None, {})
+_GET_MEMO_SIZE = 512
+_MISSING = object()
+
 
 def _base_dir() -> str:
     return os.environ.get('CHEEKAI_CONFIG_DIR') or _DEFAULT_BASE_DIR
@@ -17,6 +46,10 @@ def _file_path() -> str:
     return os.path.join(_base_dir(), 'api_config.json')
 
 
+def _wal_path() -> str:
+    return os.path.join(_base_dir(), 'api_config.wal')
+
+
 def _versions_dir() -> str:
     return os.path.join(_base_dir(), 'versions')
 
@@ -25,121 +58,458 @@ def _ensure_dirs():
     os.makedirs(_base_dir(), exist_ok=True)
     os.makedirs(_versions_dir(), exist_ok=True)
 
+# Formatted from the localtime() fields directly; strftime goes through the
+# locale-aware C path and these run on every mutation.
 def _now_iso():
-    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime())
+    t = time.localtime()
+    return f'{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}'
 
 def _timestamp():
-    return time.strftime('%Y%m%d%H%M%S', time.localtime())
+    t = time.localtime()
+    return f'{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}'
+
+def _stamp(cfg, record):
+    # a mutation's WAL record carries the version/updatedAt it published
+    if isinstance(record.get('ts'), str):
+        cfg["updatedAt"] = record['ts']
+    if isinstance(record.get('version'), str):
+        cfg["version"] = record['version']
 
 def _read_file(path):
     if not os.path.exists(path):
         return None
-    with open(path, 'r', encoding='utf-8') as f:
+    with open(path, 'rb') as f:
         try:
-            return json.load(f)
+            return loads(f.read())
         except Exception:
             return None
 
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
 def _write_atomic(path, data):
     tmp = path + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False)
+    with open(tmp, 'wb') as f:
+        f.write(dumps(data))
     os.replace(tmp, path)
 
 
+def _link_version(file_path, ver_path, data):
+    # api_config.json is only ever replaced (never rewritten in place), so a
+    # hardlink to the freshly written inode is an immutable snapshot of it.
+    try:
+        os.link(file_path, ver_path)
+        return
+    except FileExistsError:
+        # same-second save: drop the older snapshot for this timestamp
+        try:
+            os.remove(ver_path)
+            os.link(file_path, ver_path)
+            return
+        except OSError:
+            pass
+    except (OSError, AttributeError, NotImplementedError):
+        # no hardlink support (filesystem or platform)
+        pass
+    _write_atomic(ver_path, data)
+
+
+def _append_wal(record):
+    line = dumps(record) + b'\n'
+    with open(_wal_path(), 'ab') as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _truncate_wal():
+    try:
+        with open(_wal_path(), 'wb'):
+            pass
+    except Exception:
+        pass
+
+
+@functools.lru_cache(maxsize=512)
+def _split_path(key):
+    return tuple(key.split('.'))
+
+
+def _walk(data, parts):
+    cur = data
+    for p in parts:
+        if isinstance(cur, dict) and p in cur:
+            cur = cur[p]
+        else:
+            return None
+    return cur
+
+
+def _set_path(data, parts, val):
+    node = data
+    for p in parts[:-1]:
+        if p not in node or not isinstance(node[p], dict):
+            node[p] = {}
+        node = node[p]
+    node[parts[-1]] = val
+
+
+def _delete_path(data, parts):
+    node = data
+    for p in parts[:-1]:
+        if p not in node or not isinstance(node[p], dict):
+            return False
+        node = node[p]
+    if parts[-1] in node:
+        del node[parts[-1]]
+        return True
+    return False
+
+
+def _copy_along(cfg, parts):
+    """Shallow-copy cfg and every dict on the dotted path so it can be mutated
+    without touching the published snapshot; untouched branches stay shared."""
+    new_cfg = dict(cfg)
+    data = cfg.get('data')
+    if not parts or not isinstance(data, dict):
+        return new_cfg
+    node = new_cfg['data'] = dict(data)
+    for p in parts[:-1]:
+        child = node.get(p)
+        if not isinstance(child, dict):
+            break
+        node[p] = child = dict(child)
+        node = child
+    return new_cfg
+
+
+def _apply_record(cfg, record):
+    op = record.get('op')
+    parts = _split_path(record.get('key')) if record.get('key') else ()
+    if op == 'set':
+        if not parts:
+            cfg['data'] = record.get('value')
+        else:
+            if not isinstance(cfg.get('data'), dict):
+                cfg['data'] = {}
+            _set_path(cfg['data'], parts, record.get('value'))
+    elif op == 'append' and parts:
+        if not isinstance(cfg.get('data'), dict):
+            cfg['data'] = {}
+        cur = _walk(cfg['data'], parts)
+        # a new list rather than an in-place append: the old one may still be shared with a reader
+        _set_path(cfg['data'], parts, (cur if isinstance(cur, list) else []) + [record.get('value')])
+    elif op == 'delete' and parts and isinstance(cfg.get('data'), dict):
+        _delete_path(cfg['data'], parts)
+    elif op == 'replace' and isinstance(record.get('value'), dict):
+        cfg.clear()
+        cfg.update(record['value'])
+
+
+def _replay_wal(cfg):
+    path = _wal_path()
+    if not os.path.exists(path):
+        return cfg
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = loads(line)
+            except Exception:
+                # a torn trailing record from a crash mid-append; nothing after it is valid
+                break
+            _apply_record(cfg, record)
+            _stamp(cfg, record)
+    return cfg
+
+
+def _scan_versions(versions_dir):
+    # names sort as plain strings (fixed-width timestamps); is_file() uses the
+    # d_type scandir already has, so no per-entry stat
+    with os.scandir(versions_dir) as it:
+        return tuple(sorted((e.name[:-5] for e in it if e.name.endswith('.json') and e.is_file()), reverse=True))
+
+
+def _cached_versions():
+    # caller holds _lock
+    global _versions_cache
+    versions_dir = _versions_dir()
+    if _versions_cache[0] != versions_dir:
+        _ensure_dirs()
+        _versions_cache = (versions_dir, _scan_versions(versions_dir))
+    return _versions_cache[1]
+
+
+def _record_version(ts):
+    # caller holds _lock and has just written versions/<ts>.json
+    global _versions_cache
+    items = _cached_versions()
+    if ts not in items:
+        items = tuple(sorted(items + (ts,), reverse=True))
+        _versions_cache = (_versions_cache[0], items)
+
+
 def _rotate_versions():
+    # caller holds _lock
+    global _versions_cache
     versions_dir = _versions_dir()
-    files = sorted([p for p in os.listdir(versions_dir)], reverse=True)
-    if len(files) > MAX_VERSIONS:
-        for p in files[MAX_VERSIONS:]:
+    items = _cached_versions()
+    if len(items) > MAX_VERSIONS:
+        prefix = os.path.join(versions_dir, '')
+        for name in items[MAX_VERSIONS:]:
             try:
-                os.remove(os.path.join(versions_dir, p))
+                os.remove(prefix + name + '.json')
             except Exception:
                 pass
+        _versions_cache = (versions_dir, items[:MAX_VERSIONS])
+
+
+def _writer_loop():
+    while True:
+        _write_q.get()
+        try:
+            store.checkpoint()
+        except Exception:
+            logging.exception("config_checkpoint_failed")
+        finally:
+            _write_q.task_done()
+
+
+def _ensure_writer():
+    # caller holds _lock
+    t = _writer["thread"]
+    if t is None or not t.is_alive():
+        t = threading.Thread(target=_writer_loop, name="config-writer", daemon=True)
+        _writer["thread"] = t
+        t.start()
+
+
+def _reset_for_tests():
+    """Forget every cached snapshot and pending write, e.g. after pointing
+    CHEEKAI_CONFIG_DIR at a fresh directory; queued checkpoints become no-ops."""
+    global _snapshot, _versions_cache, _get_memo
+    with _lock:
+        if _pending["timer"] is not None:
+            _pending["timer"].cancel()
+        _pending.update(writes=0, timer=None, queued=False, first=0.0, last=0.0)
+        _snapshot = (None, None)
+        _versions_cache = (None, ())
+        _get_memo = (None, {})
 
 
 class ConfigStore:
-    def load(self):
-        _ensure_dirs()
+    def _current(self):
+        """Return the published config, re-reading it if the file changed on disk.
+
+        A cache hit costs one stat; directories are only created on a reload.
+        """
         file_path = _file_path()
+        stat = _stat_key(file_path)
+        snap_stat, snap_cfg = _snapshot
+        if stat is not None and snap_stat == stat:
+            return snap_cfg
+        with _lock:
+            return self._reload_locked(file_path)
+
+    def _reload_locked(self, file_path):
+        global _snapshot
+        stat = _stat_key(file_path)
+        snap_stat, snap_cfg = _snapshot
+        if stat is not None and snap_stat == stat:
+            return snap_cfg
+        _ensure_dirs()
         data = _read_file(file_path)
         if not data:
             data = {"version": "v0", "updatedAt": _now_iso(), "data": {}}
             _write_atomic(file_path, data)
+            stat = _stat_key(file_path)
+        data = _replay_wal(data)
+        _snapshot = (stat, data)
         return data
 
-    def save(self, cfg):
+    def load(self, shared=False):
+        """Return a copy of the config that the caller may change freely.
+
+        With ``shared=True`` only the top level is copied and ``data`` stays
+        shared with the published snapshot: that is for callers that just
+        serialize it or reassign ``cfg["data"]`` wholesale, and they must never
+        mutate nested values in place.
+        """
+        cfg = dict(self._current())
+        if not shared:
+            cfg["data"] = copy.deepcopy(cfg.get("data"))
+        return cfg
+
+    def _checkpoint_locked(self, cfg):
+        # cfg becomes the published snapshot, so it must not be shared with a caller
+        global _snapshot
         _ensure_dirs()
         file_path = _file_path()
         versions_dir = _versions_dir()
-        with _lock:
-            ts = _timestamp()
-            cfg["version"] = ts
+        # mutations stamp the snapshot as they are published; the checkpoint keeps that stamp
+        ts = cfg.get("version")
+        if not (isinstance(ts, str) and len(ts) == 14 and ts.isdigit()):
+            ts = cfg["version"] = _timestamp()
             cfg["updatedAt"] = _now_iso()
-            _write_atomic(file_path, cfg)
-            _write_atomic(os.path.join(versions_dir, ts + '.json'), cfg)
-            _rotate_versions()
+        _write_atomic(file_path, cfg)
+        _truncate_wal()
+        _snapshot = (_stat_key(file_path), cfg)
+        _link_version(file_path, os.path.join(versions_dir, ts + '.json'), cfg)
+        _record_version(ts)
+        _rotate_versions()
+        _pending["writes"] = 0
+        _pending["queued"] = False
+        if _pending["timer"] is not None:
+            _pending["timer"].cancel()
+            _pending["timer"] = None
+
+    def save(self, cfg):
+        """Publish cfg, stamped with a new version/updatedAt, and log it to the
+        WAL; the file and version snapshot are written by the background writer."""
+        _ensure_dirs()
+        cfg = copy.deepcopy(cfg)
+        with _lock:
+            self._reload_locked(_file_path())
+            self._publish_locked(cfg, {"ts": _now_iso(), "op": "replace", "value": cfg})
         return True
 
-    def get(self, key):
-        cfg = self.load()
-        cur = cfg.get('data', {})
-        if not key:
-            return cur
-        parts = key.split('.')
-        for p in parts:
-            if isinstance(cur, dict) and p in cur:
-                cur = cur[p]
+    def checkpoint(self):
+        """Fold pending WAL records into api_config.json and take a version snapshot."""
+        with _lock:
+            if not _pending["writes"] or _snapshot[1] is None:
+                return False
+            self._checkpoint_locked(dict(_snapshot[1]))
+        return True
+
+    def flush(self):
+        """Wait for queued checkpoints, then fold anything still pending."""
+        _write_q.join()
+        return self.checkpoint()
+
+    def _on_timer(self):
+        with _lock:
+            _pending["timer"] = None
+            if not _pending["writes"]:
+                return
+            due = min(_pending["last"] + CHECKPOINT_DELAY, _pending["first"] + CHECKPOINT_MAX_DELAY)
+            wait = due - time.monotonic()
+            if wait > 0:
+                # more mutations arrived since the timer was armed; debounce again
+                self._arm_timer_locked(wait)
             else:
-                return None
+                self._request_checkpoint_locked()
+
+    def _arm_timer_locked(self, delay):
+        timer = threading.Timer(delay, self._on_timer)
+        timer.daemon = True
+        _pending["timer"] = timer
+        timer.start()
+
+    def _request_checkpoint_locked(self):
+        if not _pending["writes"] or _pending["queued"]:
+            return
+        _ensure_writer()
+        try:
+            _write_q.put_nowait(None)
+        except queue.Full:
+            self._checkpoint_locked(dict(_snapshot[1]))
+            return
+        _pending["queued"] = True
+
+    def _publish_locked(self, cfg, record):
+        # cfg is a fresh copy, so its version/updatedAt can be stamped in place;
+        # readers see the new version immediately, not only after the checkpoint
+        global _snapshot
+        record["version"] = _timestamp()
+        _stamp(cfg, record)
+        _append_wal(record)
+        _snapshot = (_snapshot[0], cfg)
+        now = time.monotonic()
+        if not _pending["writes"]:
+            _pending["first"] = now
+        _pending["last"] = now
+        _pending["writes"] += 1
+        if _pending["writes"] >= CHECKPOINT_EVERY:
+            self._request_checkpoint_locked()
+        elif _pending["timer"] is None:
+            # one timer per burst; _on_timer re-arms it rather than each write resetting it
+            self._arm_timer_locked(CHECKPOINT_DELAY)
+
+    def get(self, key):
+        """Value at the dotted key, shared with the published snapshot.
+
+        Like load(shared=True) the result is read-only: a caller that wants to
+        change it must copy.deepcopy() it first and write it back with set().
+        """
+        global _get_memo
+        cfg = self._current()
+        memo = _get_memo
+        if memo[0] is not cfg or len(memo[1]) >= _GET_MEMO_SIZE:
+            memo = _get_memo = (cfg, {})
+        cur = memo[1].get(key, _MISSING)
+        if cur is _MISSING:
+            cur = cfg.get('data', {})
+            if key:
+                cur = _walk(cur, _split_path(key))
+            memo[1][key] = cur
         return cur
 
     def set(self, key, val):
-        cfg = self.load()
-        cur = cfg.get('data', {})
-        parts = key.split('.') if key else []
-        if not parts:
-            cfg['data'] = val
-        else:
-            node = cur
-            for p in parts[:-1]:
-                if p not in node or not isinstance(node[p], dict):
-                    node[p] = {}
-                node = node[p]
-            node[parts[-1]] = val
-            cfg['data'] = cur
-        self.save(cfg)
+        parts = _split_path(key) if key else ()
+        record = {"ts": _now_iso(), "op": "set", "key": key or "", "value": copy.deepcopy(val)}
+        with _lock:
+            cfg = _copy_along(self._reload_locked(_file_path()), parts)
+            _apply_record(cfg, record)
+            self._publish_locked(cfg, record)
+        return True
+
+    def append(self, key, val):
+        """Append val to the list at key (starting one if there is none); the WAL
+        record carries only val, not the whole list."""
+        parts = _split_path(key)
+        record = {"ts": _now_iso(), "op": "append", "key": key, "value": copy.deepcopy(val)}
+        with _lock:
+            cfg = _copy_along(self._reload_locked(_file_path()), parts)
+            _apply_record(cfg, record)
+            self._publish_locked(cfg, record)
         return True
 
     def delete(self, key):
-        cfg = self.load()
-        cur = cfg.get('data', {})
-        parts = key.split('.')
-        node = cur
-        for p in parts[:-1]:
-            if p not in node or not isinstance(node[p], dict):
+        parts = _split_path(key)
+        with _lock:
+            cfg = _copy_along(self._reload_locked(_file_path()), parts)
+            cur = cfg.get('data', {})
+            if not isinstance(cur, dict) or not _delete_path(cur, parts):
                 return False
-            node = node[p]
-        if parts[-1] in node:
-            del node[parts[-1]]
-            cfg['data'] = cur
-            self.save(cfg)
-            return True
-        return False
+            self._publish_locked(cfg, {"ts": _now_iso(), "op": "delete", "key": key})
+        return True
 
     def versions(self):
-        _ensure_dirs()
-        versions_dir = _versions_dir()
-        items = []
-        for p in sorted(os.listdir(versions_dir), reverse=True):
-            if p.endswith('.json'):
-                items.append(p[:-5])
-        return items
+        """Version names newest-first, including the one the pending checkpoint
+        will write; the listing never waits for that checkpoint."""
+        versions_dir, items = _versions_cache
+        if versions_dir != _versions_dir():
+            with _lock:
+                items = _cached_versions()
+        cfg = _snapshot[1]
+        pending = cfg.get("version") if _pending["writes"] and cfg is not None else None
+        if isinstance(pending, str) and pending not in items:
+            items = sorted(items + (pending,), reverse=True)[:MAX_VERSIONS]
+        return list(items)
 
     def rollback(self, ts):
-        versions_dir = _versions_dir()
-        path = os.path.join(versions_dir, ts + '.json')
-        data = _read_file(path)
+        """Restore version ts; the published snapshot is used as-is when it is
+        that version, otherwise pending writes are checkpointed before its file is read."""
+        cfg = self._current()
+        if cfg.get("version") == ts:
+            data = cfg
+        else:
+            self.flush()
+            data = _read_file(os.path.join(_versions_dir(), ts + '.json'))
         if not data:
             return False
         self.save(data)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""Response classes shared by the routers."""
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from .json_codec import dumps
+
+
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered through json_codec (orjson when installed)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(model: BaseModel) -> OrjsonResponse:
+    """Serialize an already-built response model directly.
+
+    Returning a Response makes FastAPI skip jsonable_encoder and re-validating
+    the payload against response_model, which stays on the route for the
+    OpenAPI schema only.
+    """
+    return OrjsonResponse(content=model.model_dump(mode="json"))
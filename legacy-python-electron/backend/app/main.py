@@ -6,11 +6,15 @@ Routes are organized into separate router modules for better maintainability.
 """
 
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from .config_store import store
 from .core.config import CORS_ORIGINS
+from .core.responses import OrjsonResponse
+from .providers import closeGLMClient
 from .routers import detect_router, config_router, history_router
 
 # Configure logging
@@ -19,11 +23,27 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Flush config changes and close pooled GLM connections on shutdown."""
+    try:
+        yield
+    finally:
+        try:
+            # write out config changes still waiting for a background checkpoint
+            store.flush()
+        finally:
+            await closeGLMClient()
+
+
 # Create FastAPI application
 api = FastAPI(
     title="CheekAI Detection API",
     description="AI-generated text detection service",
     version="0.1.0",
+    default_response_class=OrjsonResponse,
+    lifespan=lifespan,
 )
 
 # Configure CORS middleware
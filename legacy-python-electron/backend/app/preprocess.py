@@ -1,11 +1,14 @@
 """Shared preprocessing helpers for document uploads and tooling."""
 from __future__ import annotations
 
+import codecs
 import io
 import re
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 
 from .service import (
     buildParagraphBlocksFromNodes,
@@ -16,16 +19,48 @@ from .service import (
 
 HEADING_META_KEYWORDS = ["副标题", "Subheading", "Subtitle", "编号", "No.", "NO.", "序号"]
 
+_TEXT_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# compiled once: build_structured_nodes runs these on every line of an upload
+_HEADING_RE = re.compile(
+    r"^(?:第[0-9一二三四五六七八九十百千]+[章节部分]"
+    r"|(?:Chapter|CHAPTER)\s+\d+\b"
+    r"|(?:[IVXLCM]+\.|\d+(?:\.\d+)*[.,、])\s*\S+)"
+)
+# every _HEADING_RE alternative starts with one of these or a digit; most lines
+# are plain prose and are turned away on the first character
+_HEADING_FIRST_CHARS = frozenset("第CIVXLM")
+_LIST_NUMBER_RE = re.compile(r"^\d+[\.)]\s+\S")
+_META_DATE_RE = re.compile(r"^\d{4}[-/年]\d{1,2}([-/月]\d{1,2})?")
+_META_ALLCAPS_RE = re.compile(r"^[A-Z]{2,}$")
+# alternatives are tried in order ("1.2." before "1."); the group that matched names the level
+_HEADING_LEVEL_RE = re.compile(
+    r"^(?:(?P<chapter>第[一二三四五六七八九十百千]+章)"
+    r"|(?P<section>第[一二三四五六七八九十百千]+节)"
+    r"|(?P<subsection>\d+\.\d+\.)"
+    r"|(?P<numbered>\d+\.\s*\S+))"
+)
+_HEADING_LEVELS = {"chapter": 1, "section": 2, "subsection": 3, "numbered": 1}
+
 
 def decode_uploaded_file(name: str, data: bytes) -> str:
     lower = (name or "").lower()
     if lower.endswith(".txt"):
-        for enc in ("utf-8", "gbk", "latin1"):
+        # a BOM settles the encoding without trial decodes (and is not kept in the text)
+        for bom, enc in _TEXT_BOMS:
+            if data.startswith(bom):
+                return data.decode(enc, errors="replace")
+        # a failed trial stops at the first invalid byte; latin1 accepts any input
+        for enc in ("utf-8", "gbk"):
             try:
                 return data.decode(enc)
-            except Exception:
+            except UnicodeDecodeError:
                 continue
-        return data.decode("utf-8", errors="ignore")
+        return data.decode("latin1")
     if lower.endswith(".docx"):
         from docx import Document
 
@@ -46,11 +81,8 @@ def _is_heading_line(line: str) -> bool:
         return True
     if line.endswith((":", "：")):
         return True
-    if re.match(r"^第[0-9一二三四五六七八九十百千]+[章节部分]", line):
-        return True
-    if re.match(r"^(?:Chapter|CHAPTER)\s+\d+\b", line):
-        return True
-    if re.match(r"^(?:[IVXLCM]+\.|\d+(?:\.\d+)*[.,、])\s*\S+", line):
+    first = line[0]
+    if (first in _HEADING_FIRST_CHARS or first.isdigit()) and _HEADING_RE.match(line):
         return True
     if len(line) <= 30 and not line.endswith(("。", "！", "？", ".", "!", "?")):
         return True
@@ -60,7 +92,7 @@ def _is_heading_line(line: str) -> bool:
 def _is_list_line(line: str) -> bool:
     if line.startswith(("-", "•", "*")):
         return True
-    if re.match(r"^\d+[\.)]\s+\S", line) and (
+    if line[:1].isdigit() and _LIST_NUMBER_RE.match(line) and (
         len(line) > 30 or line.endswith(("。", "！", "？", ".", "!", "?"))
     ):
         return True
@@ -74,9 +106,9 @@ def _is_heading_meta_line(line: str) -> bool:
         return True
     if any(k in line for k in HEADING_META_KEYWORDS):
         return True
-    if re.match(r"^\d{4}[-/年]\d{1,2}([-/月]\d{1,2})?", line):
+    if _META_DATE_RE.match(line):
         return True
-    if re.match(r"^[A-Z]{2,}$", line):
+    if _META_ALLCAPS_RE.match(line):
         return True
     return False
 
@@ -88,50 +120,57 @@ def _heading_level(line: str) -> Optional[int]:
         return 2
     if line.startswith("#"):
         return 1
-    if re.match(r"^第[一二三四五六七八九十百千]+章", line):
-        return 1
-    if re.match(r"^第[一二三四五六七八九十百千]+节", line):
-        return 2
-    if re.match(r"^\d+\.\d+\.", line):
-        return 3
-    if re.match(r"^\d+\.\s*\S+", line):
-        return 1
-    return None
+    m = _HEADING_LEVEL_RE.match(line)
+    return _HEADING_LEVELS[m.lastgroup] if m else None
 
 
-def build_structured_nodes(normalized: str) -> Tuple[List[Dict[str, Any]], str, Dict[str, int]]:
-    lines = [ln.strip() for ln in normalized.split("\n")]
-    line_starts: List[int] = []
-    line_ends: List[int] = []
+def _iter_lines(text: str) -> Iterator[Tuple[int, int, str]]:
+    """(start, end, stripped line) for every "\n"-separated line of text.
+
+    Offsets advance by the stripped length plus one per line break, which is
+    what the node offsets have always been measured in.
+    """
     cursor = 0
-    for ln in lines:
-        line_starts.append(cursor)
-        line_ends.append(cursor + len(ln))
-        cursor = line_ends[-1] + 1
+    pos = 0
+    while True:
+        nl = text.find("\n", pos)
+        line = (text[pos:] if nl < 0 else text[pos:nl]).strip()
+        yield cursor, cursor + len(line), line
+        if nl < 0:
+            return
+        cursor += len(line) + 1
+        pos = nl + 1
 
+
+def build_structured_nodes(normalized: str) -> Tuple[List[Dict[str, Any]], str, Dict[str, int]]:
     structured: List[Dict[str, Any]] = []
-    i = 0
-    while i < len(lines):
-        ln = lines[i]
-        start = line_starts[i]
-        end = line_ends[i]
+    # the formatted text is written as nodes are found; join + strip of the old
+    # line list equals stripping these "\n"-terminated writes
+    formatted = io.StringIO()
+    headings = paragraphs = list_items = 0
+    lines = _iter_lines(normalized)
+    # one line of lookahead lets a heading absorb the meta lines that follow it
+    pending = next(lines, None)
+    while pending is not None:
+        start, end, ln = pending
+        pending = next(lines, None)
         if _is_heading_line(ln) and ln:
             meta_count = 0
             parts = [ln]
-            j = i + 1
-            while j < len(lines):
-                nxt = lines[j].strip()
+            while pending is not None:
+                nxt = pending[2]
                 if nxt and _is_heading_meta_line(nxt):
                     parts.append(nxt)
-                    end = line_ends[j]
+                    end = pending[1]
                     meta_count += 1
-                    j += 1
+                    pending = next(lines, None)
                     continue
                 break
+            heading_text = "\n".join(parts)
             structured.append(
                 {
                     "type": "heading",
-                    "text": "\n".join(parts),
+                    "text": heading_text,
                     "startOffset": start,
                     "endOffset": end,
                     "sectionPath": f"H:{ln}",
@@ -139,7 +178,8 @@ def build_structured_nodes(normalized: str) -> Tuple[List[Dict[str, Any]], str,
                     "metaCount": meta_count,
                 }
             )
-            i = j
+            formatted.write(f"## {heading_text}\n\n")
+            headings += 1
             continue
         if _is_list_line(ln) and ln:
             structured.append(
@@ -151,7 +191,8 @@ def build_structured_nodes(normalized: str) -> Tuple[List[Dict[str, Any]], str,
                     "sectionPath": "",
                 }
             )
-            i += 1
+            formatted.write(f"• {ln.lstrip('-•').strip()}\n")
+            list_items += 1
             continue
         if ln:
             structured.append(
@@ -163,111 +204,111 @@ def build_structured_nodes(normalized: str) -> Tuple[List[Dict[str, Any]], str,
                     "sectionPath": "",
                 }
             )
-        i += 1
-
-    formatted_lines: List[str] = []
-    for node in structured:
-        if node["type"] == "heading":
-            formatted_lines.append(f"## {node['text']}")
-            formatted_lines.append("")
-        elif node["type"] == "list_item":
-            formatted_lines.append(f"• {node['text'].lstrip('-•').strip()}")
-        else:
-            formatted_lines.append(node["text"])
-            formatted_lines.append("")
+            formatted.write(f"{ln}\n\n")
+            paragraphs += 1
 
-    format_summary = {
-        "headings": sum(1 for n in structured if n["type"] == "heading"),
-        "paragraphs": sum(1 for n in structured if n["type"] == "paragraph"),
-        "listItems": sum(1 for n in structured if n["type"] == "list_item"),
-    }
+    format_summary = {"headings": headings, "paragraphs": paragraphs, "listItems": list_items}
+
+    return structured, formatted.getvalue().strip(), format_summary
 
-    return structured, "\n".join(formatted_lines).strip(), format_summary
+
+def _node_columns(structured_nodes: List[Dict[str, Any]]) -> Tuple[List[int], List[int], List[str]]:
+    """Start offsets, end offsets and types of the nodes as parallel lists, for the mapping loops."""
+    return (
+        [n["startOffset"] for n in structured_nodes],
+        [n["endOffset"] for n in structured_nodes],
+        [n["type"] for n in structured_nodes],
+    )
 
 
 def _build_segment_node_mapping(
-    segments: Iterable[Dict[str, Any]], structured_nodes: List[Dict[str, Any]]
+    segments: Iterable[Dict[str, Any]],
+    structured_nodes: List[Dict[str, Any]],
+    columns: Optional[Tuple[List[int], List[int], List[str]]] = None,
 ) -> Tuple[
     Dict[int, List[Dict[str, Any]]],
     Dict[int, List[Dict[str, Any]]],
     List[int],
     List[int],
     Dict[int, int],
+    List[Dict[str, Any]],
 ]:
     seg_node_map: Dict[int, List[Dict[str, Any]]] = {}
     node_chunk_map: Dict[int, List[Dict[str, Any]]] = {}
     primary_node_for_chunk: Dict[int, int] = {}
     unmapped_chunks: List[int] = []
-    unmapped_nodes: List[int] = []
+    # chunks split across nodes, or covering too little of their best node
+    mismatches: List[Dict[str, Any]] = []
+
+    node_starts, node_ends, node_types = columns or _node_columns(structured_nodes)
+    node_lengths = [max(1, e - s) for s, e in zip(node_starts, node_ends)]
+    node_count = len(structured_nodes)
+    # build_structured_nodes emits disjoint nodes in text order, so only the run
+    # of nodes between the segment's start and end can overlap it
+    ordered = all(node_ends[k] <= node_starts[k + 1] for k in range(node_count - 1))
 
     for seg in segments:
         sid = int(seg["chunkId"])
         s_start = seg["offsets"]["start"]
         s_end = seg["offsets"]["end"]
         hits: List[Dict[str, Any]] = []
-        for idx, node in enumerate(structured_nodes):
-            n_start = node["startOffset"]
-            n_end = node["endOffset"]
-            overlap = max(0, min(s_end, n_end) - max(s_start, n_start))
+        first = bisect_right(node_ends, s_start) if ordered else 0
+        for idx in range(first, node_count):
+            n_start = node_starts[idx]
+            if ordered and n_start >= s_end:
+                break
+            n_end = node_ends[idx]
+            overlap = (s_end if s_end < n_end else n_end) - (s_start if s_start > n_start else n_start)
             if overlap <= 0:
                 continue
-            coverage = overlap / max(1, (n_end - n_start))
+            coverage = overlap / node_lengths[idx]
             if coverage < 0.2:
                 continue
-            hit = {
-                "nodeIndex": idx,
-                "overlapChars": overlap,
-                "coverageRatio": round(coverage, 4),
-            }
-            hits.append(hit)
-            node_chunk_map.setdefault(idx, []).append(
-                {"chunkId": sid, "overlapChars": overlap, "coverageRatio": hit["coverageRatio"]}
-            )
+            ratio = round(coverage, 4)
+            hits.append({"nodeIndex": idx, "overlapChars": overlap, "coverageRatio": ratio})
+            node_chunk_map.setdefault(idx, []).append({"chunkId": sid, "overlapChars": overlap, "coverageRatio": ratio})
         if hits:
             hits.sort(key=lambda x: (-x["coverageRatio"], -x["overlapChars"]))
-            body_hits = [
-                h for h in hits if structured_nodes[h["nodeIndex"]]["type"] in {"paragraph", "list_item"}
-            ]
-            preferred = body_hits[0]["nodeIndex"] if body_hits else hits[0]["nodeIndex"]
+            preferred = next(
+                (h["nodeIndex"] for h in hits if node_types[h["nodeIndex"]] in ("paragraph", "list_item")),
+                hits[0]["nodeIndex"],
+            )
             primary_node_for_chunk[sid] = preferred
             seg_node_map[sid] = hits
+            if len(hits) >= 2 or hits[0]["coverageRatio"] < 0.8:
+                mismatches.append({"chunkId": sid, "hits": hits})
         else:
             unmapped_chunks.append(sid)
 
-    for idx in range(len(structured_nodes)):
-        if idx not in node_chunk_map:
-            unmapped_nodes.append(idx)
-
-    return seg_node_map, node_chunk_map, unmapped_chunks, unmapped_nodes, primary_node_for_chunk
-
+    unmapped_nodes = [idx for idx in range(node_count) if idx not in node_chunk_map]
 
-def _find_mismatches(seg_node_map: Dict[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
-    mismatches: List[Dict[str, Any]] = []
-    for chunk_id, hits in seg_node_map.items():
-        if not hits:
-            continue
-        if len(hits) >= 2 or hits[0].get("coverageRatio", 0) < 0.8:
-            mismatches.append({"chunkId": chunk_id, "hits": hits})
-    return mismatches
+    return seg_node_map, node_chunk_map, unmapped_chunks, unmapped_nodes, primary_node_for_chunk, mismatches
 
 
 def _heading_body_assoc_ok(
     seg_node_map: Dict[int, List[Dict[str, Any]]],
     node_chunk_map: Dict[int, List[Dict[str, Any]]],
-    structured_nodes: List[Dict[str, Any]],
+    node_types: List[str],
 ) -> bool:
-    heading_idx = [i for i, n in enumerate(structured_nodes) if n.get("type") == "heading"]
-    for hi in heading_idx:
-        chunks = node_chunk_map.get(hi, [])
-        if not chunks:
-            continue
-        if any(
-            structured_nodes[item.get("nodeIndex", -1)]["type"] in {"paragraph", "list_item"}
-            for chunk in chunks
-            for item in seg_node_map.get(chunk["chunkId"], [])
-        ):
+    """True when every heading that some chunk covers shares a chunk with body text."""
+    # whether a chunk reaches a paragraph/list node, shared by every heading it covers
+    chunk_has_body: Dict[int, bool] = {}
+    # only nodes some chunk covers can fail, so walk those rather than every heading
+    for hi, chunks in node_chunk_map.items():
+        if node_types[hi] != "heading":
             continue
-        return False
+        for chunk in chunks:
+            cid = chunk["chunkId"]
+            ok = chunk_has_body.get(cid)
+            if ok is None:
+                ok = chunk_has_body[cid] = any(
+                    node_types[item.get("nodeIndex", -1)] in ("paragraph", "list_item")
+                    for item in seg_node_map.get(cid, ())
+                )
+            if ok:
+                break
+        else:
+            return False
     return True
 
 
@@ -318,36 +359,44 @@ def preprocess_document(
         oneSegmentPerBlock=True,
     )
 
-    seg_node_map_before, node_chunk_map_before, unmapped_chunks_before, unmapped_nodes_before, _ = (
-        _build_segment_node_mapping(before_segments, structured)
-    )
+    columns = _node_columns(structured)
+    node_types = columns[2]
+    (
+        seg_node_map_before,
+        node_chunk_map_before,
+        unmapped_chunks_before,
+        unmapped_nodes_before,
+        _,
+        mismatches_before,
+    ) = _build_segment_node_mapping(before_segments, structured, columns)
     (
         seg_node_map_after,
         node_chunk_map_after,
         unmapped_chunks_after,
         unmapped_nodes_after,
         primary_after,
-    ) = _build_segment_node_mapping(aligned_segments, structured)
+        mismatches_after,
+    ) = _build_segment_node_mapping(aligned_segments, structured, columns)
 
     comparison = {
         "before": {
             "segmentCount": len(before_segments),
             "nodeCount": len(structured),
-            "mismatches": _find_mismatches(seg_node_map_before),
+            "mismatches": mismatches_before,
             "unmappedChunks": unmapped_chunks_before,
             "unmappedNodes": unmapped_nodes_before,
             "headingBodyAssociationOk": _heading_body_assoc_ok(
-                seg_node_map_before, node_chunk_map_before, structured
+                seg_node_map_before, node_chunk_map_before, node_types
             ),
         },
         "after": {
             "segmentCount": len(aligned_segments),
             "nodeCount": len(structured),
-            "mismatches": _find_mismatches(seg_node_map_after),
+            "mismatches": mismatches_after,
             "unmappedChunks": unmapped_chunks_after,
             "unmappedNodes": unmapped_nodes_after,
             "headingBodyAssociationOk": _heading_body_assoc_ok(
-                seg_node_map_after, node_chunk_map_after, structured
+                seg_node_map_after, node_chunk_map_after, node_types
             ),
         },
     }
@@ -374,6 +423,10 @@ def preprocess_document(
     }
 
 
+def _decode_and_preprocess(name: str, data: bytes, **options: Any) -> Dict[str, Any]:
+    return preprocess_document(decode_uploaded_file(name, data), **options)
+
+
 async def preprocess_upload_file(
     file: UploadFile,
     *,
@@ -383,9 +436,12 @@ async def preprocess_upload_file(
     overlap_tokens: int,
 ) -> Dict[str, Any]:
     data = await file.read()
-    text = decode_uploaded_file(file.filename or "file", data)
-    return preprocess_document(
-        text,
+    # PDF/DOCX extraction and both segmentation passes are CPU-bound; run them on a
+    # worker thread so other requests keep being served meanwhile
+    return await run_in_threadpool(
+        _decode_and_preprocess,
+        file.filename or "file",
+        data,
         normalize_punctuation=normalize_punctuation,
         auto_language=auto_language,
         chunk_size_tokens=chunk_size_tokens,
@@ -1,17 +1,17 @@
+import asyncio
+import importlib.util
 import os
+import threading
 import time
-import json
-import re
+import weakref
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 import httpx
 from .config_store import store
+from .core.json_codec import dumps, loads
 import logging
 
 
-_JSON_EXTRACT_RE = re.compile(r"\{.*\}", re.DOTALL)
-
-
 def parseProvider(spec: str) -> Dict[str, str]:
     parts = spec.split(":", 1)
     if len(parts) == 2:
@@ -33,6 +33,15 @@ def setGLMKey(key: Optional[str]) -> None:
         pass
 
 
+def _log_key_source(source: str, key: str) -> None:
+    # getGLMKey runs on every request; skip building the message unless debug logging is on
+    try:
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("glm_key_load source=%s len=%s", source, len(key))
+    except Exception:
+        pass
+
+
 def getGLMKey() -> Optional[str]:
     val = store.get('glm.apiKey')
     if val is None:
@@ -40,33 +49,21 @@ def getGLMKey() -> Optional[str]:
     if isinstance(val, str):
         v = val.strip()
         if v:
-            try:
-                logging.debug(f"glm_key_load source=file len={len(v)}")
-            except Exception:
-                pass
+            _log_key_source("file", v)
             return v
     if isinstance(_GLM_KEY, str) and _GLM_KEY.strip():
         v = _GLM_KEY.strip()
-        try:
-            logging.debug(f"glm_key_load source=memory len={len(v)}")
-        except Exception:
-            pass
+        _log_key_source("memory", v)
         return v
     env1 = os.environ.get("GLM_API_KEY") or os.environ.get("DEEPSEEK_API_KEY")
     if env1 and env1.strip():
         v = env1.strip()
-        try:
-            logging.debug(f"glm_key_load source=env(primary) len={len(v)}")
-        except Exception:
-            pass
+        _log_key_source("env(primary)", v)
         return v
     env2 = os.environ.get("CHEEKAI_GLM_API_KEY") or os.environ.get("CHEEKAI_DEEPSEEK_API_KEY")
     if env2 and env2.strip():
         v = env2.strip()
-        try:
-            logging.debug(f"glm_key_load source=env(secondary) len={len(v)}")
-        except Exception:
-            pass
+        _log_key_source("env(secondary)", v)
         return v
     try:
         logging.debug("glm_key_load source=none")
@@ -75,6 +72,89 @@ def getGLMKey() -> Optional[str]:
     return None
 
 
+# one pooled client per event loop: a client's connections belong to the loop that opened them.
+# An open client keeps its loop reachable, so entries only go away through closeGLMClient() or,
+# once their loop has been closed, on the next lookup; a caller that runs a fresh loop per job
+# (asyncio.run) should await closeGLMClient() before leaving it, as service.detect() does.
+_GLM_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+# HTTP/2 needs the optional h2 package; without it the pool speaks HTTP/1.1
+_GLM_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _get_glm_client() -> httpx.AsyncClient:
+    """Client for the running loop, so GLM calls reuse pooled connections instead of a new TLS handshake each."""
+    loop = asyncio.get_running_loop()
+    for owner in [o for o in _GLM_CLIENTS if o.is_closed()]:
+        # nothing can await aclose() on a closed loop any more; drop the entry so the loop can be collected
+        _GLM_CLIENTS.pop(owner, None)
+    client = _GLM_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = _GLM_CLIENTS[loop] = httpx.AsyncClient(
+            http2=_GLM_HTTP2,
+            timeout=80,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        )
+    return client
+
+
+async def closeGLMClient() -> None:
+    """Close every pooled GLM client whose loop is still usable.
+
+    The running loop's client is closed here; clients of loops running in other
+    threads are closed on those loops. Call it before leaving a loop that made
+    GLM calls (the app does this on shutdown).
+    """
+    loop = asyncio.get_running_loop()
+    for owner, client in list(_GLM_CLIENTS.items()):
+        if client.is_closed:
+            _GLM_CLIENTS.pop(owner, None)
+        elif owner is loop:
+            _GLM_CLIENTS.pop(owner, None)
+            await client.aclose()
+        elif owner.is_running() and not owner.is_closed():
+            _GLM_CLIENTS.pop(owner, None)
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), owner))
+
+
+# strong references to in-flight log writes so they are not collected mid-run
+_PENDING_LOG_WRITES: Set["asyncio.Task[None]"] = set()
+_GLM_LOG_PATH = Path(__file__).resolve().parents[1] / "logs" / "glm_last_response.json"
+# writes run on worker threads; the lock serializes them against each other and clearGLMLog
+_GLM_LOG_LOCK = threading.Lock()
+_glm_log_seq = 0  # sequence number of the latest payload handed to a writer
+_glm_log_floor = 0  # payloads numbered at or below this were superseded or cleared
+
+
+def _write_glm_log(seq: int, log_payload: Dict[str, Any]) -> None:
+    global _glm_log_floor
+    with _GLM_LOG_LOCK:
+        if seq <= _glm_log_floor:
+            return
+        _glm_log_floor = seq
+        try:
+            _GLM_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            # written aside and renamed in, so a reader never sees a partial file
+            tmp = _GLM_LOG_PATH.with_name(f"{_GLM_LOG_PATH.name}.{os.getpid()}.{seq}.tmp")
+            tmp.write_bytes(dumps(log_payload, indent=True))
+            os.replace(tmp, _GLM_LOG_PATH)
+        except Exception as log_exc:
+            try:
+                logging.debug("glm_log_write_failed %s", log_exc)
+            except Exception:
+                pass
+
+
+def clearGLMLog() -> None:
+    """Delete glm_last_response.json; log writes still pending are dropped."""
+    global _glm_log_floor
+    with _GLM_LOG_LOCK:
+        _glm_log_floor = _glm_log_seq
+        try:
+            _GLM_LOG_PATH.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
 async def callGLMChat(
     model: str,
     api_key: str,
@@ -86,6 +166,7 @@ async def callGLMChat(
     client: Optional[httpx.AsyncClient] = None,
     retry_on_empty: bool = True,
 ) -> Optional[Dict[str, Any]]:
+    global _glm_log_seq
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": model,
@@ -100,87 +181,77 @@ async def callGLMChat(
     if enable_reasoning:
         payload["reasoning"] = {"effort": reasoning_effort}
     url = os.environ.get("GLM_API_URL", "https://open.bigmodel.cn/api/paas/v4/chat/completions")
-    close_client = False
     if client is None:
-        client = httpx.AsyncClient(timeout=80)
-        close_client = True
+        client = _get_glm_client()
     started = time.time()
     try:
-        try:
-            r = await client.post(url, headers=headers, json=payload)
-        except Exception as exc:
-            logging.exception("glm_call_failed_request")
-            raise RuntimeError(f"GLM 调用失败: {exc}") from exc
-        latency_ms = int((time.time() - started) * 1000)
-        try:
-            body_preview = r.text[:200]
-        except Exception:
-            body_preview = ""
-        if r.status_code != 200:
-            logging.error("glm_call_http_error status=%s latency_ms=%s body=%s", r.status_code, latency_ms, body_preview)
-            raise RuntimeError(f"GLM HTTP error {r.status_code}")
-        try:
-            data = r.json()
-        except Exception as exc:
-            logging.error("glm_call_invalid_json latency_ms=%s body=%s", latency_ms, body_preview)
-            raise RuntimeError("GLM response JSON parse failed") from exc
+        r = await client.post(url, headers=headers, json=payload)
+    except Exception as exc:
+        logging.exception("glm_call_failed_request")
+        raise RuntimeError(f"GLM 调用失败: {exc}") from exc
+    latency_ms = int((time.time() - started) * 1000)
+    try:
+        body_preview = r.text[:200]
+    except Exception:
+        body_preview = ""
+    if r.status_code != 200:
+        logging.error("glm_call_http_error status=%s latency_ms=%s body=%s", r.status_code, latency_ms, body_preview)
+        raise RuntimeError(f"GLM HTTP error {r.status_code}")
+    try:
+        data = loads(r.content)
+    except Exception as exc:
+        logging.error("glm_call_invalid_json latency_ms=%s body=%s", latency_ms, body_preview)
+        raise RuntimeError("GLM response JSON parse failed") from exc
+    content = None
+    reasoning = None
+    try:
+        choice = data.get("choices", [{}])[0]
+        message = choice.get("message", {}) if isinstance(choice, dict) else {}
+        content = message.get("content")
+        reasoning = message.get("reasoning_content") or data.get("reasoning_content")
+    except Exception:
         content = None
-        reasoning = None
-        try:
-            choice = data.get("choices", [{}])[0]
-            message = choice.get("message", {}) if isinstance(choice, dict) else {}
-            content = message.get("content")
-            reasoning = message.get("reasoning_content") or data.get("reasoning_content")
-        except Exception:
-            content = None
-        if not content and reasoning:
-            # 尝试从 reasoning_content 中提取 JSON 片段；若无法提取则继续走 retry 分支
-            m = _JSON_EXTRACT_RE.search(reasoning)
-            content = m.group(0) if m else None
-        if not content and retry_on_empty:
-            logging.error("glm_call_missing_content latency_ms=%s body=%s -> retry_without_reasoning", latency_ms, body_preview)
-            return await callGLMChat(
-                model,
-                api_key,
-                system,
-                user,
-                max_tokens=max_tokens,
-                enable_reasoning=False,
-                reasoning_effort=reasoning_effort,
-                client=client if not close_client else None,
-                retry_on_empty=False,
-            )
-        if not content:
-            logging.error("glm_call_missing_content latency_ms=%s body=%s", latency_ms, body_preview)
-            raise RuntimeError("GLM 返回缺少内容")
-        try:
-            logging.info("glm_call_ok model=%s latency_ms=%s", model, latency_ms)
-        except Exception:
-            pass
-        result = {"content": content, "raw": data, "latency_ms": latency_ms}
-        if reasoning:
-            result["reasoning"] = reasoning
-        try:
-            log_dir = Path(__file__).resolve().parents[1] / "logs"
-            log_dir.mkdir(parents=True, exist_ok=True)
-            log_path = log_dir / "glm_last_response.json"
-            log_payload = {
-                "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
-                "model": model,
-                "latencyMs": latency_ms,
-                "response": data,
-            }
-            with open(log_path, "w", encoding="utf-8") as f:
-                json.dump(log_payload, f, ensure_ascii=False, indent=2)
-        except Exception as log_exc:
-            try:
-                logging.debug("glm_log_write_failed %s", log_exc)
-            except Exception:
-                pass
-        return result
-    finally:
-        if close_client:
-            await client.aclose()
+    if not content and reasoning:
+        # 尝试从 reasoning_content 中提取 JSON 片段；若无法提取则继续走 retry 分支
+        # first "{" through last "}", found by literal scans rather than a backtracking regex
+        s = reasoning.find("{")
+        e = reasoning.rfind("}")
+        content = reasoning[s:e + 1] if 0 <= s < e else None
+    if not content and retry_on_empty:
+        logging.error("glm_call_missing_content latency_ms=%s body=%s -> retry_without_reasoning", latency_ms, body_preview)
+        return await callGLMChat(
+            model,
+            api_key,
+            system,
+            user,
+            max_tokens=max_tokens,
+            enable_reasoning=False,
+            reasoning_effort=reasoning_effort,
+            client=client,
+            retry_on_empty=False,
+        )
+    if not content:
+        logging.error("glm_call_missing_content latency_ms=%s body=%s", latency_ms, body_preview)
+        raise RuntimeError("GLM 返回缺少内容")
+    try:
+        logging.info("glm_call_ok model=%s latency_ms=%s", model, latency_ms)
+    except Exception:
+        pass
+    result = {"content": content, "raw": data, "latency_ms": latency_ms}
+    if reasoning:
+        result["reasoning"] = reasoning
+    log_payload = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+        "model": model,
+        "latencyMs": latency_ms,
+        "response": data,
+    }
+    # the disk write happens off the event loop; the reply does not wait for it
+    _glm_log_seq += 1
+    task = asyncio.create_task(asyncio.to_thread(_write_glm_log, _glm_log_seq, log_payload))
+    _PENDING_LOG_WRITES.add(task)
+    task.add_done_callback(_PENDING_LOG_WRITES.discard)
+    return result
 
 
 def getDeepSeekKey() -> Optional[str]:
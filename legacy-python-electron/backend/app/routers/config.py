@@ -2,24 +2,36 @@
 """Configuration routes - /api/config/*, /api/providers."""
 
 import logging
-from typing import Dict, Any
+from typing import Any, Dict
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter
 
 from ..providers import getGLMKey, setGLMKey
 from ..config_store import store
+from ..core.request_body import body_schema, parse_body
+from ..core.responses import OrjsonResponse
 from ..preprocess import preprocess_upload_file
 from ..schemas import PreprocessUploadResponse, PreprocessSummary, SegmentResponse
+from .history import reset_review_stats
 
 router = APIRouter()
 
 
+def _touches_review(path: str) -> bool:
+    return path == "review" or path.startswith("review.")
+
+
 class GLMKeyBody(BaseModel):
     """Request body for GLM API key."""
     apiKey: str
 
 
+_JSON_OBJECT_ADAPTER = TypeAdapter(Dict[str, Any])
+_PATCH_BODY_SCHEMA = {"type": "object", "properties": {"value": {}}, "required": ["value"]}
+
+
 @router.get("/api/health")
 def health():
     """Health check endpoint."""
@@ -60,26 +72,31 @@ def get_glm_check():
 @router.get("/api/config/file")
 def get_config_file():
     """Get config file contents."""
-    return store.load()
+    return OrjsonResponse(content=store.load(shared=True))
 
 
-@router.put("/api/config/file")
-def put_config_file(body: Dict[str, Any]):
+@router.put("/api/config/file", openapi_extra=body_schema(_JSON_OBJECT_ADAPTER.json_schema()))
+async def put_config_file(request: Request):
     """Replace config file contents."""
-    cfg = store.load()
-    if not isinstance(body, dict):
-        raise HTTPException(status_code=400, detail={"code": "invalid_body", "message": "需为JSON对象"})
+    body = await parse_body(request, _JSON_OBJECT_ADAPTER)
+    # data is replaced wholesale, so the shared view is enough
+    cfg = await run_in_threadpool(store.load, True)
     cfg["data"] = body.get("data", body)
-    store.save(cfg)
+    await run_in_threadpool(store.save, cfg)
+    # the new contents may carry any review logs; let the counters be rebuilt from them
+    await run_in_threadpool(reset_review_stats)
     return {"ok": True}
 
 
-@router.patch("/api/config/file/{path:path}")
-def patch_config_file(path: str, body: Dict[str, Any]):
+@router.patch("/api/config/file/{path:path}", openapi_extra=body_schema(_PATCH_BODY_SCHEMA))
+async def patch_config_file(path: str, request: Request):
     """Patch config file at path."""
+    body = await parse_body(request, _JSON_OBJECT_ADAPTER)
     if "value" not in body:
         raise HTTPException(status_code=400, detail={"code": "invalid_body", "message": "缺少value"})
-    store.set(path, body.get("value"))
+    await run_in_threadpool(store.set, path, body.get("value"))
+    if _touches_review(path):
+        await run_in_threadpool(reset_review_stats)
     return {"ok": True}
 
 
@@ -89,6 +106,8 @@ def delete_config_file(path: str):
     ok = store.delete(path)
     if not ok:
         raise HTTPException(status_code=404, detail={"code": "not_found", "message": "不存在"})
+    if _touches_review(path):
+        reset_review_stats()
     return {"ok": True}
 
 
@@ -99,14 +118,16 @@ def get_config_versions():
 
 
 @router.post("/api/config/file/rollback")
-def post_config_rollback(body: Dict[str, Any]):
+async def post_config_rollback(request: Request):
     """Rollback config to version."""
+    body = await parse_body(request, _JSON_OBJECT_ADAPTER)
     ts = str(body.get("version", "")).strip()
     if not ts:
         raise HTTPException(status_code=400, detail={"code": "invalid_version", "message": "缺少version"})
-    ok = store.rollback(ts)
+    ok = await run_in_threadpool(store.rollback, ts)
     if not ok:
         raise HTTPException(status_code=404, detail={"code": "version_not_found", "message": "版本不存在"})
+    await run_in_threadpool(reset_review_stats)
     return {"ok": True}
 
 
@@ -131,18 +152,7 @@ async def preprocess_upload(
     return PreprocessUploadResponse(
         normalizedText=result["normalizedText"],
         preprocessSummary=PreprocessSummary(**result["preprocessSummary"]),
-        segments=[
-            SegmentResponse(
-                chunkId=s["chunkId"],
-                language=s["language"],
-                offsets=s["offsets"],
-                aiProbability=s["aiProbability"],
-                confidence=s["confidence"],
-                signals=s["signals"],
-                explanations=s["explanations"],
-            )
-            for s in result["segments"]
-        ],
+        segments=[SegmentResponse.model_validate(s) for s in result["segments"]],
         structuredNodes=result["structuredNodes"],
         formattedText=result["formattedText"],
         formatSummary=result["formatSummary"],
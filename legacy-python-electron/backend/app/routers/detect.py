@@ -2,11 +2,14 @@
 """Detection routes - /api/detect, /api/detect/batch, /api/paper/analyze, etc."""
 
 import asyncio
+import heapq
 import logging
 import uuid
-from typing import List
+from typing import AsyncIterator, List, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 
 from ..schemas import (
     DetectRequest,
@@ -32,11 +35,10 @@ from ..schemas import (
 )
 from ..service import (
     detect_async,
+    prepare_batch_inputs,
+    start_llm_segments_batch,
     setCalibration,
-    applyCalibration,
     getRubricInfo,
-    DEFAULT_BUFFER_MARGIN,
-    deriveDecision,
     getPromptVariants,
     paper_analyze,
     _calibration,
@@ -44,7 +46,11 @@ from ..service import (
     _rubric_changelog,
 )
 from ..providers import getGLMKey
+from ..core.json_codec import dumps
+from ..core.request_body import body_schema, parse_body
+from ..core.responses import model_response
 from ..services.response_builder import (
+    apply_calibration,
     build_detect_response,
     build_batch_item_response,
     build_aggregation_response,
@@ -52,10 +58,26 @@ from ..services.response_builder import (
 
 router = APIRouter()
 
+# Built once; the hot endpoints validate the raw body with pydantic-core's JSON
+# parser instead of going through FastAPI's per-request body resolution.
+_DETECT_ADAPTER = TypeAdapter(DetectRequest)
+_BATCH_ADAPTER = TypeAdapter(BatchDetectRequest)
 
-@router.post("/api/detect", response_model=DetectResponse)
-async def post_detect(req: DetectRequest):
+
+def _percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (rounded index into the ascending order); 0.0 when empty."""
+    if not values:
+        return 0.0
+    n = len(values)
+    idx = int(max(0, min(n - 1, round(q * (n - 1)))))
+    # the idx-th smallest is the (n - idx)-th largest; only the top tail is heap-ordered
+    return heapq.nlargest(n - idx, values)[-1]
+
+
+@router.post("/api/detect", response_model=DetectResponse, openapi_extra=body_schema(_DETECT_ADAPTER.json_schema()))
+async def post_detect(request: Request):
     """Single text detection endpoint."""
+    req: DetectRequest = await parse_body(request, _DETECT_ADAPTER)
     try:
         logging.info(f"detect_request len={len(req.text or '')} providers={req.providers}")
     except Exception:
@@ -78,35 +100,124 @@ async def post_detect(req: DetectRequest):
         logging.exception("detect_internal_error")
         raise HTTPException(status_code=502, detail={"code": "detect_failed", "message": str(exc)})
 
-    # Apply calibration
-    agg["overallProbability"] = applyCalibration(agg["overallProbability"])
-    agg["decision"] = deriveDecision(
-        agg["overallProbability"],
-        agg["thresholds"],
-        float(agg.get("bufferMargin", DEFAULT_BUFFER_MARGIN))
-    )
-    for s in segments:
-        s["aiProbability"] = applyCalibration(s["aiProbability"])
-    
+    apply_calibration(agg, segments)
+
     # Apply calibration to dual detection results if available
     if dual_detection:
         # Calibrate sentence detection results
-        sent_agg = dual_detection["sentence"]["aggregation"]
-        sent_agg["overallProbability"] = applyCalibration(sent_agg["overallProbability"])
-        sent_agg["decision"] = deriveDecision(
-            sent_agg["overallProbability"],
-            sent_agg["thresholds"],
-            float(sent_agg.get("bufferMargin", DEFAULT_BUFFER_MARGIN))
-        )
-        for s in dual_detection["sentence"]["segments"]:
-            s["aiProbability"] = applyCalibration(s["aiProbability"])
+        apply_calibration(dual_detection["sentence"]["aggregation"], dual_detection["sentence"]["segments"])
 
-    return build_detect_response(agg, segments, pre_summary, cost, dual_detection)
+    return model_response(build_detect_response(agg, segments, pre_summary, cost, dual_detection))
 
 
-@router.post("/api/detect/batch", response_model=BatchDetectResponse)
-async def post_detect_batch(req: BatchDetectRequest):
-    """Batch text detection endpoint."""
+async def _run_batch_item(it, plan, prepared_input=None) -> BatchItemResponse:
+    agg, segments, pre_summary, cost, _ = await detect_async(
+        it.text,
+        it.language or "zh-CN",
+        it.chunking.chunkSizeTokens,
+        it.chunking.overlapTokens,
+        it.providers,
+        it.genre,
+        it.usePerplexity,
+        it.useStylometry,
+        it.sensitivity,
+        enable_dual_detection=False,  # Disable for batch to save resources
+        segment_plan=plan,
+        prepared_input=prepared_input,
+    )
+    apply_calibration(agg, segments)
+
+    return build_batch_item_response(it.id, agg, segments, pre_summary, cost)
+
+
+async def _plan_batch_segments(items, parallel) -> Tuple[List[object], List["asyncio.Future[object]"]]:
+    """Prepare every item once off the event loop, then start its LLM segment plan.
+
+    Returns (prepared detect inputs, plan futures), both index-aligned with items;
+    plans are shared-prompt where the sizes allow.
+    """
+    docs = [
+        {
+            "text": it.text,
+            "language": it.language or "zh-CN",
+            "chunkSizeTokens": it.chunking.chunkSizeTokens,
+            "overlapTokens": it.chunking.overlapTokens,
+            "sensitivity": it.sensitivity,
+            "usePerplexity": it.usePerplexity,
+            "useStylometry": it.useStylometry,
+        }
+        for it in items
+    ]
+    prepared = await asyncio.to_thread(prepare_batch_inputs, docs)
+    plans = start_llm_segments_batch(docs, parallel, prepared)
+    return [detect_input for detect_input, _, _ in prepared], plans
+
+
+async def _await_plan(plan: "asyncio.Future[object]") -> object:
+    """The item's plan, or None (plan locally) if planning failed."""
+    try:
+        return await plan
+    except Exception:
+        logging.exception("batch_segment_plan_failed")
+        return None
+
+
+async def _iter_batch_results(items, parallel) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (index, BatchItemResponse or exception) in completion order."""
+    parallel = max(1, int(parallel or 4))
+    try:
+        inputs, plans = await _plan_batch_segments(items, parallel)
+    except Exception:
+        logging.exception("batch_segment_plan_failed")
+        inputs, plans = None, None
+    worker_count = min(parallel, len(items))
+    pending: asyncio.Queue = asyncio.Queue()
+    for idx, it in enumerate(items):
+        pending.put_nowait((idx, it))
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker() -> None:
+        # a fixed pool drains the queue so only worker_count coroutines exist at once
+        while True:
+            try:
+                idx, it = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                # each item waits only for its own plan, so early items stream out first
+                plan = await _await_plan(plans[idx]) if plans is not None else None
+                r = await _run_batch_item(it, plan, inputs[idx] if inputs is not None else None)
+            except Exception as exc:
+                r = exc
+            results.put_nowait((idx, r))
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(worker_count)]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        # a streaming client that disconnects stops the remaining work: cancelling a worker
+        # cancels its detect_async, which cancels the judgment calls it has in flight
+        for w in workers:
+            w.cancel()
+        for p in plans or ():
+            p.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def _batch_summary(count: int, fails: int, probs: List[float]) -> BatchSummary:
+    avg = sum(probs) / len(probs) if probs else 0.0
+    return BatchSummary(count=count, failCount=fails, avgProbability=avg, p95Probability=_percentile(probs, 0.95))
+
+
+@router.post("/api/detect/batch", response_model=BatchDetectResponse, openapi_extra=body_schema(_BATCH_ADAPTER.json_schema()))
+async def post_detect_batch(request: Request):
+    """Batch text detection endpoint.
+
+    With ``Accept: application/x-ndjson`` items are streamed one JSON line each
+    as they finish (completion order), followed by a ``{"summary": ...}`` line.
+    """
+    req: BatchDetectRequest = await parse_body(request, _BATCH_ADAPTER)
     if not req.items:
         raise HTTPException(status_code=400, detail={"code": "empty_batch", "message": "至少需要 1 条待检测任务"})
 
@@ -115,56 +226,32 @@ async def post_detect_batch(req: BatchDetectRequest):
     except Exception:
         pass
 
-    sem_count = max(1, int(req.parallel or 4))
-    sem = asyncio.Semaphore(sem_count)
-
-    async def run_item(it) -> BatchItemResponse:
-        async with sem:
-            agg, segments, pre_summary, cost, _ = await detect_async(
-                it.text,
-                it.language or "zh-CN",
-                it.chunking.chunkSizeTokens,
-                it.chunking.overlapTokens,
-                it.providers,
-                it.genre,
-                it.usePerplexity,
-                it.useStylometry,
-                it.sensitivity,
-                enable_dual_detection=False,  # Disable for batch to save resources
-            )
-            # Apply calibration
-            agg["overallProbability"] = applyCalibration(agg["overallProbability"])
-            agg["decision"] = deriveDecision(
-                agg["overallProbability"],
-                agg["thresholds"],
-                float(agg.get("bufferMargin", DEFAULT_BUFFER_MARGIN))
-            )
-            for s in segments:
-                s["aiProbability"] = applyCalibration(s["aiProbability"])
-
-            return build_batch_item_response(it.id, agg, segments, pre_summary, cost)
-
-    tasks = [run_item(it) for it in req.items]
-    done = await asyncio.gather(*tasks, return_exceptions=True)
-
-    items: List[BatchItemResponse] = []
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(_stream_batch(req), media_type="application/x-ndjson")
+
+    done: List[object] = [None] * len(req.items)
+    async for idx, r in _iter_batch_results(req.items, req.parallel):
+        done[idx] = r
+
+    items: List[BatchItemResponse] = [r for r in done if not isinstance(r, Exception)]
+    fails = len(done) - len(items)
+    probs = [r.aggregation.overallProbability for r in items]
+
+    summary = _batch_summary(len(req.items), fails, probs)
+    return model_response(BatchDetectResponse(items=items, summary=summary))
+
+
+async def _stream_batch(req: BatchDetectRequest) -> AsyncIterator[bytes]:
     probs: List[float] = []
     fails = 0
-
-    for r in done:
+    async for _, r in _iter_batch_results(req.items, req.parallel):
         if isinstance(r, Exception):
             fails += 1
             continue
-        items.append(r)
         probs.append(r.aggregation.overallProbability)
-
-    probs.sort()
-    avg = sum(probs) / max(1, len(probs)) if probs else 0.0
-    idx = int(max(0, min(len(probs) - 1, round(0.95 * (len(probs) - 1))))) if probs else 0
-    p95 = probs[idx] if probs else 0.0
-
-    summary = BatchSummary(count=len(req.items), failCount=fails, avgProbability=avg, p95Probability=p95)
-    return BatchDetectResponse(items=items, summary=summary)
+        yield dumps(r.model_dump(mode="json")) + b"\n"
+    summary = _batch_summary(len(req.items), fails, probs)
+    yield dumps({"summary": summary.model_dump(mode="json")}) + b"\n"
 
 
 @router.post("/api/calibrate", response_model=CalibrateResponse)
@@ -232,12 +319,8 @@ async def post_paper_analyze(req: PaperAnalyzeRequest):
         enable_dual_detection=False,  # Disable for paper analyze
     )
 
-    agg["overallProbability"] = applyCalibration(agg["overallProbability"])
-    agg["decision"] = deriveDecision(
-        agg["overallProbability"],
-        agg["thresholds"],
-        float(agg.get("bufferMargin", DEFAULT_BUFFER_MARGIN))
-    )
+    # only the aggregation is returned here, so segments are left uncalibrated
+    apply_calibration(agg, [])
 
     suggestions = []
     if readability["clarity"] < 0.6:
@@ -247,7 +330,7 @@ async def post_paper_analyze(req: PaperAnalyzeRequest):
     if readability["cohesion"] < 0.6:
         suggestions.append({"title": "加强篇章衔接", "detail": "保持段落主题连续性与术语一致性，避免跳跃式表述。"})
 
-    return PaperAnalyzeResponse(
+    return model_response(PaperAnalyzeResponse(
         aggregation=build_aggregation_response(agg),
         readability=ReadabilityScores(**readability),
         multiRound=MultiRoundSummary(
@@ -260,4 +343,4 @@ async def post_paper_analyze(req: PaperAnalyzeRequest):
             trimmedAvgConfidence=summary.get("trimmedAvgConfidence"),
         ),
         suggestions=[SuggestionItem(**s) for s in suggestions],
-    )
+    ))
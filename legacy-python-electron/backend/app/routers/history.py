@@ -2,7 +2,9 @@
 """History and review routes - /api/history/*, /api/review/*."""
 
 import time
-from typing import Dict, Any
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List
 
 from fastapi import APIRouter
 
@@ -18,9 +20,80 @@ from ..schemas import (
     ReviewSummaryResponse,
 )
 from ..config_store import store
+from ..core.json_codec import dumps
+from ..core.responses import model_response
 
 router = APIRouter()
 
+_HISTORY_LIMIT = 100
+# HistoryItem models for the rows returned by the last history listing, keyed by row JSON
+_history_item_memo: Dict[bytes, HistoryItem] = {}
+
+
+def _history_deque(items) -> Deque[Dict[str, Any]]:
+    """Newest-first history capped at _HISTORY_LIMIT; appendleft drops the oldest entry."""
+    # islice keeps the newest entries if the stored list is somehow longer than the cap
+    return deque(islice(items, _HISTORY_LIMIT), maxlen=_HISTORY_LIMIT)
+
+
+_REVIEW_LOGS_KEY = "review.logs"
+_REVIEW_STATS_KEY = "review.stats"
+_REVIEW_STAT_KEYS = ("total", "pass", "review", "flag", "labeled", "tp", "tn", "fp", "fn")
+
+
+def _count_review(stats: Dict[str, int], item: Dict[str, Any]) -> None:
+    """Add one review log entry to the running counters."""
+    decision = item.get("decision")
+    label = item.get("label")
+    stats["total"] += 1
+    if decision in ("pass", "review", "flag"):
+        stats[decision] += 1
+    if label in (0, 1) and decision in ("pass", "flag"):
+        stats["labeled"] += 1
+        if decision == "flag":
+            stats["tp" if label == 1 else "fp"] += 1
+        else:
+            stats["fn" if label == 1 else "tn"] += 1
+
+
+def _review_stats_from_logs(logs) -> Dict[str, int]:
+    stats = dict.fromkeys(_REVIEW_STAT_KEYS, 0)
+    for item in logs:
+        _count_review(stats, item)
+    return stats
+
+
+def _valid_review_stats(stats: Any, total: int) -> bool:
+    return (
+        isinstance(stats, dict)
+        and all(isinstance(stats.get(k), int) for k in _REVIEW_STAT_KEYS)
+        and stats["total"] == total
+    )
+
+
+def reset_review_stats() -> None:
+    """Drop the stored counters so the next review call rebuilds them from the logs.
+
+    The config file routes call this whenever they may have rewritten review.logs.
+    """
+    store.delete(_REVIEW_STATS_KEY)
+
+
+def _review_stats() -> Dict[str, int]:
+    """A private copy of the review counters.
+
+    The stored counters are trusted as long as they cover the stored log count;
+    they are rebuilt from the logs only when missing (after reset_review_stats)
+    or malformed.
+    """
+    logs = store.get(_REVIEW_LOGS_KEY)
+    if not isinstance(logs, list):
+        logs = []
+    stats = store.get(_REVIEW_STATS_KEY)
+    if _valid_review_stats(stats, len(logs)):
+        return dict(stats)
+    return _review_stats_from_logs(logs)
+
 
 @router.post("/api/history/save", response_model=HistorySaveResponse)
 def post_history_save(req: HistorySaveRequest):
@@ -32,15 +105,18 @@ def post_history_save(req: HistorySaveRequest):
         "aggregation": req.aggregation.dict(),
         "multiRound": req.multiRound.dict() if req.multiRound else None,
     }
-    items = store.get("paper.history") or []
-    items.insert(0, item)
-    store.set("paper.history", items[:100])
-    return HistorySaveResponse(ok=True, total=len(items))
+    stored = store.get("paper.history") or []
+    items = _history_deque(stored)
+    items.appendleft(item)
+    store.set("paper.history", list(items))
+    # total counts the stored items plus the new one, before the oldest is dropped
+    return HistorySaveResponse(ok=True, total=len(stored) + 1)
 
 
 @router.get("/api/history/list", response_model=HistoryListResponse)
 def get_history_list():
     """List history items."""
+    global _history_item_memo
     items = store.get("paper.history") or []
 
     def map_item(x: Dict[str, Any]) -> HistoryItem:
@@ -52,14 +128,23 @@ def get_history_list():
             multiRound=MultiRoundSummary(**x.get("multiRound", {})) if x.get("multiRound") else None,
         )
 
-    return HistoryListResponse(items=[map_item(x) for x in items])
+    # each stored row is validated the first time it is listed; later polls reuse the
+    # model as long as the row's JSON is unchanged
+    memo: Dict[bytes, HistoryItem] = {}
+    result: List[HistoryItem] = []
+    for x in items:
+        key = dumps(x)
+        item = memo.get(key) or _history_item_memo.get(key) or map_item(x)
+        memo[key] = item
+        result.append(item)
+    _history_item_memo = memo
+    return model_response(HistoryListResponse(items=result))
 
 
 @router.post("/api/review/submit", response_model=ReviewSubmitResponse)
 def post_review_submit(req: ReviewSubmitRequest):
     """Submit review."""
-    cfg = store.load()
-    logs = cfg.get("data", {}).get("review", {}).get("logs", [])
+    stats = _review_stats()
     item = {
         "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()),
         "requestId": req.requestId,
@@ -69,40 +154,34 @@ def post_review_submit(req: ReviewSubmitRequest):
         "label": int(req.label) if req.label is not None else None,
         "notes": req.notes or "",
     }
-    logs.append(item)
-    store.set("review.logs", logs)
-    passCount = sum(1 for x in logs if x.get("decision") == "pass")
-    reviewCount = sum(1 for x in logs if x.get("decision") == "review")
-    flagCount = sum(1 for x in logs if x.get("decision") == "flag")
+    # only the new entry and the counters are written, never the whole log
+    _count_review(stats, item)
+    store.append(_REVIEW_LOGS_KEY, item)
+    store.set(_REVIEW_STATS_KEY, stats)
     return ReviewSubmitResponse(
         ok=True,
-        total=len(logs),
-        passCount=passCount,
-        reviewCount=reviewCount,
-        flagCount=flagCount
+        total=stats["total"],
+        passCount=stats["pass"],
+        reviewCount=stats["review"],
+        flagCount=stats["flag"]
     )
 
 
 @router.get("/api/review/summary", response_model=ReviewSummaryResponse)
 def get_review_summary():
     """Get review summary with metrics."""
-    logs = store.get("review.logs") or []
-    labeled = [x for x in logs if x.get("label") in (0, 1) and x.get("decision") in ("pass", "flag")]
-
-    tp = sum(1 for x in labeled if x.get("decision") == "flag" and x.get("label") == 1)
-    tn = sum(1 for x in labeled if x.get("decision") == "pass" and x.get("label") == 0)
-    fp = sum(1 for x in labeled if x.get("decision") == "flag" and x.get("label") == 0)
-    fn = sum(1 for x in labeled if x.get("decision") == "pass" and x.get("label") == 1)
+    stats = _review_stats()
+    tp, tn, fp, fn = stats["tp"], stats["tn"], stats["fp"], stats["fn"]
 
-    denom = max(1, len(labeled))
+    denom = max(1, stats["labeled"])
     accuracy = (tp + tn) / denom
     precision = tp / max(1, (tp + fp))
     recall = tp / max(1, (tp + fn))
     f1 = (2 * precision * recall) / max(1e-6, (precision + recall))
 
     return ReviewSummaryResponse(
-        total=len(logs),
-        labeled=len(labeled),
+        total=stats["total"],
+        labeled=stats["labeled"],
         tp=tp,
         tn=tn,
         fp=fp,
@@ -6,35 +6,68 @@ import json
 import logging
 import math
 import re
-import statistics
 import time
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
 
 try:
-    from .providers import callGLMChat, getGLMKey, parseProvider
+    from .core.json_codec import dumps as _json_dumps, loads as _json_loads
+    from .providers import callGLMChat, clearGLMLog, closeGLMClient, getGLMKey, parseProvider
 except ImportError:  # allow running as standalone script
     import pathlib
     import sys
 
     sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
-    from providers import callGLMChat, getGLMKey, parseProvider  # type: ignore
-
-
-_LLM_SEGMENT_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+    from core.json_codec import dumps as _json_dumps, loads as _json_loads  # type: ignore
+    from providers import callGLMChat, clearGLMLog, closeGLMClient, getGLMKey, parseProvider  # type: ignore
+
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+|[\u4e00-\u9fff]")
+# _TOKEN_RE split by alternative: every CJK character is its own token, so
+# counting CJK runs and summing their lengths stays inside the regex engine
+# instead of producing one match per character.
+_ASCII_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_CJK_RUN_RE = re.compile(r"[\u4e00-\u9fff]+")
+_WORD_TOKEN_RE = re.compile(r"\w+|[\u4e00-\u9fff]")
+_SENT_SPLIT_RE = re.compile(r"(?<=[\u3002\uff01\uff1f?!])\s+")
+_WS_COLLAPSE_RE = re.compile(r"\s+")
+_HSPACE_RE = re.compile(r"[ \t\f\v]+")
+# a run of lines that each hold a non-space character, ending after the last "\n"
+_PARAGRAPH_RE = re.compile(r"^(?:[^\S\n]*\S[^\n]*(?:\n|\Z))+", re.MULTILINE)
+# every line boundary str.splitlines() knows besides "\n"
+_ODD_LINE_BREAKS = "\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+_JSON_DECODER = json.JSONDecoder()
+_PUNCT_COUNT_RE = re.compile(r"[，。！？.!?]")
+# Curly quotes, em dash, ideographic/no-break spaces and lone CR in one pass.
+_PUNCT_TRANSLATION = str.maketrans({
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u2018": "'",
+    "\u2019": "'",
+    "\u2014": "-",
+    "\u3000": " ",
+    "\u00A0": " ",
+    "\r": "\n",
+})
+
+
+_RUNTIME_LOG_DIR = Path(__file__).resolve().parents[1] / "logs"
+# glm_last_response.json is cleared through providers so in-flight log writes are dropped too
+_RUNTIME_CACHE_FILES = (_RUNTIME_LOG_DIR / "detect_cache.json",)
 
 
 def _clear_runtime_cache() -> None:
     """清理当前运行时缓存（包括 API 调用缓存等）。"""
-    try:
-        log_dir = Path(__file__).resolve().parents[1] / "logs"
-        for fname in ("glm_last_response.json", "detect_cache.json"):
-            f = log_dir / fname
-            if f.exists():
-                f.unlink()
-    except Exception:
-        # 清理失败不影响主流程
-        pass
+    clearGLMLog()
+    for f in _RUNTIME_CACHE_FILES:
+        try:
+            f.unlink(missing_ok=True)
+        except Exception:
+            # 清理失败不影响主流程
+            pass
 
 
 # ---------------------------------------------------------------------------
@@ -44,23 +77,38 @@ def _clear_runtime_cache() -> None:
 def normalizePunctuation(text: str) -> str:
     if not text:
         return ""
-    s = text
-    s = s.replace("\u201c", '"').replace("\u201d", '"').replace("\u2018", "'").replace("\u2019", "'")
-    s = s.replace("\u2014", "-")
-    s = re.sub(r"[\u3000\u00A0]", " ", s)
-    s = s.replace("\r\n", "\n").replace("\r", "\n")
-    s = re.sub(r"[ \t\f\v]+", " ", s)
+    s = text.replace("\r\n", "\n").translate(_PUNCT_TRANSLATION)
+    s = _HSPACE_RE.sub(" ", s)
     s = "\n".join(ln.strip() for ln in s.split("\n"))
     return s.strip()
 
 
-def estimateTokens(text: str) -> int:
-    tokens = re.findall(r"[A-Za-z0-9_]+|[\u4e00-\u9fff]", text or "")
-    return max(1, len(tokens))
+def estimateTokens(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    # start/end count a window of text in place, without slicing it out first
+    if not text:
+        return 1
+    if end is None:
+        end = len(text)
+    count = len(_ASCII_WORD_RE.findall(text, start, end)) + sum(map(len, _CJK_RUN_RE.findall(text, start, end)))
+    return max(1, count)
+
+
+def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) of every non-empty piece splitSentences returns, in order."""
+    spans: List[Tuple[int, int]] = []
+    prev = 0
+    for m in _SENT_SPLIT_RE.finditer(text):
+        # a separator always follows sentence punctuation, so the piece before it is never empty
+        spans.append((prev, m.start()))
+        prev = m.end()
+    if prev < len(text):
+        spans.append((prev, len(text)))
+    return spans
 
 
 def splitSentences(text: str) -> List[str]:
-    return [p for p in re.split(r"(?<=[\u3002\uff01\uff1f?!])\s+", text or "") if p]
+    text = text or ""
+    return [text[s:e] for s, e in _sentence_spans(text)]
 
 
 def splitSentencesAdvanced(text: str) -> List[Dict[str, Any]]:
@@ -391,49 +439,62 @@ def compareDualModeResults(
 # Paragraph block construction
 # ---------------------------------------------------------------------------
 
-def buildParagraphBlocksFromText(text: str) -> List[Dict[str, Any]]:
-    blocks: List[Dict[str, Any]] = []
-    if not text:
-        return blocks
+def _paragraph_spans(text: str) -> Iterator[Tuple[int, int, bool]]:
+    """(start, end, odd_break) for every run of non-blank lines.
+
+    A block ends where the blank line after it starts, or at len(text) when
+    no blank line follows. odd_break is set when a block line ends in a
+    separator other than "\n" (splitlines also breaks on \r, \x0b, \u2028,
+    ...), which the per-line join must then add.
+    """
+    if not any(ch in text for ch in _ODD_LINE_BREAKS):
+        # only "\n" breaks lines: one regex scan finds every block
+        for m in _PARAGRAPH_RE.finditer(text):
+            yield m.start(), m.end(), False
+        return
     cursor = 0
-    buf: List[str] = []
     buf_start: Optional[int] = None
+    odd_break = False
     for line in text.splitlines(keepends=True):
-        stripped = line.strip()
-        if stripped and buf_start is None:
-            buf_start = cursor
-        if stripped:
-            buf.append(line.rstrip("\n"))
-        elif buf:
-            block_text = "\n".join(buf).strip()
-            start = buf_start if buf_start is not None else cursor - len(line)
-            end = cursor
-            blocks.append(
-                {
-                    "index": len(blocks),
-                    "label": "body",
-                    "needDetect": True,
-                    "mergeWithPrev": False,
-                    "start": max(0, start),
-                    "end": max(start, end),
-                    "text": block_text,
-                }
-            )
-            buf = []
+        if not line.isspace():
+            if buf_start is None:
+                buf_start = cursor
+            if line[-1] != "\n":
+                odd_break = True
+        elif buf_start is not None:
+            yield buf_start, cursor, odd_break
             buf_start = None
+            odd_break = False
         cursor += len(line)
-    if buf:
-        start = buf_start if buf_start is not None else max(0, len(text) - len("\n".join(buf)))
-        end = len(text)
+    if buf_start is not None:
+        yield buf_start, len(text), odd_break
+
+
+def buildParagraphBlocksFromText(text: str) -> List[Dict[str, Any]]:
+    # "_tokens" caches estimateTokens over text[start:end] for buildSegmentsAligned
+    blocks: List[Dict[str, Any]] = []
+    if not text:
+        return blocks
+    # Blocks are tracked as offsets; a block's text is sliced out once when it
+    # closes instead of collecting stripped copies of every line.
+    for start, end, odd_break in _paragraph_spans(text):
+        if end == len(text):
+            # the block still open at the end of the text keeps its literal "\\n" join
+            block_text = "\\n".join(ln.rstrip("\n") for ln in text[start:end].splitlines(keepends=True)).strip()
+        elif odd_break:
+            block_text = "\n".join(ln.rstrip("\n") for ln in text[start:end].splitlines(keepends=True)).strip()
+        else:
+            block_text = text[start:end].strip()
         blocks.append(
             {
                 "index": len(blocks),
                 "label": "body",
                 "needDetect": True,
                 "mergeWithPrev": False,
-                "start": max(0, start),
+                "start": start,
                 "end": end,
-                "text": "\\n".join(buf).strip(),
+                "text": block_text,
+                "_tokens": estimateTokens(text, start, end),
             }
         )
     if not blocks:
@@ -446,6 +507,7 @@ def buildParagraphBlocksFromText(text: str) -> List[Dict[str, Any]]:
                 "start": 0,
                 "end": len(text),
                 "text": text,
+                "_tokens": estimateTokens(text),
             }
         )
     return blocks
@@ -521,31 +583,39 @@ SENSITIVITY_PROFILES: Dict[str, Dict[str, int]] = {
 }
 
 
+# (chunk default, overlap default, chunk cap) per sensitivity; "high" is capped at
+# its own default, every other profile at the long-text anchor limit
+_PROFILE_TABLE: Dict[str, Tuple[int, int, int]] = {
+    name: (p["chunk"], p["overlap"], p["chunk"] if name == "high" else (900 if name == "low" else 600))
+    for name, p in SENSITIVITY_PROFILES.items()
+}
+
+
 def _resolve_profile(chunk_tokens: int, overlap_tokens: int, sensitivity: str) -> Tuple[int, int]:
-    profile = SENSITIVITY_PROFILES.get(sensitivity or "medium", SENSITIVITY_PROFILES["medium"])
-    chunk = max(120, int(chunk_tokens or profile["chunk"]))
-    overlap = max(0, int(overlap_tokens or profile["overlap"]))
-    if sensitivity == "high":
-        chunk = min(chunk, profile["chunk"])
+    chunk_def, overlap_def, cap = _PROFILE_TABLE.get(sensitivity or "medium", _PROFILE_TABLE["medium"])
+    chunk = max(120, int(chunk_tokens or chunk_def))
+    overlap = max(0, int(overlap_tokens or overlap_def))
     # 为长文本设置压平锚点上限，当 chunk_tokens 接近极限时将限制在 ~600 左右
-    chunk = min(chunk, 600 if sensitivity != "low" else 900)
-    return chunk, overlap
+    return min(chunk, cap), overlap
 
 
 def preprocessText(text: str, normalize: bool = True) -> str:
     return normalizePunctuation(text) if normalize else (text or "")
 
 
-def _make_segment(
-    idx: int,
-    language: str,
-    start: int,
-    end: int,
-    text: str,
-    *,
-    usePerplexity: bool,
-    useStylometry: bool,
-) -> Dict[str, Any]:
+_STYLOMETRY_SIGNAL_KEYS = ("ttr", "avgSentenceLen", "functionWordRatio", "punctuationRatio", "repeatRatio")
+
+
+@lru_cache(maxsize=2048)
+def _analyze_segment_text(
+    text: str, usePerplexity: bool, useStylometry: bool
+) -> Tuple[Optional[float], float, Tuple[str, ...], Tuple[Any, ...]]:
+    """Text-only part of a segment: (ppl, prob, explanations, stylometry signal values).
+
+    Overlapping windows, dual (paragraph + sentence) passes and retries re-analyse
+    the same slices, so results are memoized on the text itself. Tuples keep the
+    cached entries immutable; _make_segment builds fresh dicts/lists from them.
+    """
     stylometry = computeStylometryMetrics(text) if useStylometry else {
         "ttr": 0.0,
         "avgSentenceLen": float(len(text)),
@@ -556,32 +626,53 @@ def _make_segment(
     }
     ppl = _estimate_perplexity(text) if usePerplexity else None
     prob, explanations = _score_segment(stylometry, ppl)
-    confidence = 0.55 + min(0.35, len(text) / 1800)
-    signals = {
-        "llmJudgment": {"prob": None, "models": []},
-        "perplexity": {"ppl": ppl, "z": None},
-        "stylometry": {
-            "ttr": stylometry["ttr"],
-            "avgSentenceLen": stylometry["avgSentenceLen"],
-            "functionWordRatio": stylometry["functionWordRatio"],
-            "punctuationRatio": stylometry["punctuationRatio"],
-            "repeatRatio": stylometry["repeatRatio"],
-        },
-    }
+    return ppl, prob, tuple(explanations), tuple(stylometry[k] for k in _STYLOMETRY_SIGNAL_KEYS)
+
+
+def _make_segment(
+    idx: int,
+    language: str,
+    start: int,
+    end: int,
+    text: str,
+    *,
+    usePerplexity: bool,
+    useStylometry: bool,
+) -> Dict[str, Any]:
+    ppl, prob, explanations, style_values = _analyze_segment_text(text, bool(usePerplexity), bool(useStylometry))
+    ttr, avg_sentence_len, function_ratio, punctuation_ratio, repeat_ratio = style_values
+    # literals rather than dict(zip(...)) / template copies: the cheapest way CPython builds these
     return {
         "chunkId": idx,
         "language": language or "zh-CN",
         "offsets": {"start": start, "end": end},
         "aiProbability": prob,
-        "confidence": min(0.95, confidence),
-        "signals": signals,
-        "explanations": explanations,
+        "confidence": min(0.95, 0.55 + min(0.35, len(text) / 1800)),
+        "signals": {
+            "llmJudgment": {"prob": None, "models": []},
+            "perplexity": {"ppl": ppl, "z": None},
+            "stylometry": {
+                "ttr": ttr,
+                "avgSentenceLen": avg_sentence_len,
+                "functionWordRatio": function_ratio,
+                "punctuationRatio": punctuation_ratio,
+                "repeatRatio": repeat_ratio,
+            },
+        },
+        "explanations": list(explanations),
     }
 
 
 def _summarize_block_for_llm(block: Dict[str, Any], order: int, max_chars: int = 240) -> str:
     raw = (block.get("text") or "").strip()
-    compact = re.sub(r"\s+", " ", raw)
+    # collapse only a growing prefix: once it yields more than max_chars the
+    # snippet and the "..." flag match collapsing the whole block
+    limit = max_chars * 4
+    while True:
+        compact = _WS_COLLAPSE_RE.sub(" ", raw[:limit])
+        if len(compact) > max_chars or limit >= len(raw):
+            break
+        limit *= 4
     snippet = compact[:max_chars]
     if len(compact) > max_chars:
         snippet += "..."
@@ -589,6 +680,19 @@ def _summarize_block_for_llm(block: Dict[str, Any], order: int, max_chars: int =
     return f"[{order}] label={label} len={len(raw)} text={snippet}"
 
 
+def _count_tokens_from(spans: List[Tuple[int, int]], starts: List[int], pos: int) -> int:
+    """estimateTokens(text, pos, end) from a block's token spans, without rescanning.
+
+    Tokens starting at or after pos count as-is; one straddling pos counts
+    once for its tail, exactly as a scan starting at pos would see it.
+    """
+    i = bisect_left(starts, pos)
+    n = len(starts) - i
+    if i and spans[i - 1][1] > pos:
+        n += 1
+    return max(1, n)
+
+
 def buildSegmentsAligned(
     text: str,
     language: str,
@@ -627,28 +731,30 @@ def buildSegmentsAligned(
     current_end: Optional[int] = None
     chunk_id = 0
     logged_blocks = 0
+    # the first few blocks are logged; checked once so a disabled INFO level costs nothing per block
+    log_limit = 5 if logging.getLogger().isEnabledFor(logging.INFO) else 0
     for block in detect_blocks:
-        block_tokens = estimateTokens(text[block["start"] : block["end"]])
-        if logged_blocks < 5:
-            try:
-                logging.info(
-                    "segment_block idx=%s tokens=%s span=%s..%s",
-                    block.get("index", logged_blocks),
-                    block_tokens,
-                    block["start"],
-                    block["end"],
-                )
-            except Exception:
-                pass
+        block_tokens = block.get("_tokens")
+        if block_tokens is None:
+            block_tokens = estimateTokens(text, block["start"], block["end"])
+        if logged_blocks < log_limit:
+            logging.info(
+                "segment_block idx=%s tokens=%s span=%s..%s",
+                block.get("index", logged_blocks),
+                block_tokens,
+                block["start"],
+                block["end"],
+            )
             logged_blocks += 1
         block_cursor = block["start"]
+        spans = None
         if current_start is None:
             current_start = block_cursor
         while chunk_tokens and (acc_tokens + block_tokens) >= chunk_tokens and block_cursor < block["end"]:
             need_tokens = max(1, chunk_tokens - acc_tokens)
-            remaining_text = text[block_cursor:block["end"]]
-            chars_per_token = max(1.0, len(remaining_text) / float(max(1, block_tokens)))
-            split_chars = max(1, min(len(remaining_text), int(round(chars_per_token * need_tokens))))
+            remaining_chars = block["end"] - block_cursor
+            chars_per_token = max(1.0, remaining_chars / float(max(1, block_tokens)))
+            split_chars = max(1, min(remaining_chars, int(round(chars_per_token * need_tokens))))
             current_end = block_cursor + split_chars
             segments.append(
                 _make_segment(
@@ -664,7 +770,10 @@ def buildSegmentsAligned(
             chunk_id += 1
             current_start = current_end
             block_cursor = current_end
-            block_tokens = estimateTokens(text[block_cursor:block["end"]])
+            if spans is None:
+                spans = [m.span() for m in _TOKEN_RE.finditer(text, block["start"], block["end"])]
+                span_starts = [a for a, _ in spans]
+            block_tokens = _count_tokens_from(spans, span_starts, block_cursor)
             acc_tokens = 0
         current_end = block["end"]
         acc_tokens += block_tokens
@@ -695,6 +804,140 @@ def buildSegmentsAligned(
     return segments
 
 
+def _extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse the JSON object embedded in an LLM reply that has extra prose around it.
+
+    Decodes from the first "{" with raw_decode, which stops at the end of that
+    object; if that fails, falls back to the first "{" .. last "}" slice.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        return _JSON_DECODER.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    end = text.rfind("}")
+    if end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+
+LLM_SEGMENT_BATCH_MAX_TOKENS = 6000
+# reply budget of one document's plan; a shared call gets this much per document
+LLM_SEGMENT_REPLY_TOKENS = 1600
+LLM_SEGMENT_BATCH_MAX_DOCS = 8000 // LLM_SEGMENT_REPLY_TOKENS
+_LLM_SEGMENT_SYSTEM_PROMPT = (
+    "You are a segmentation planner. Given a list of BODY paragraphs,"
+    " decide how to merge adjacent items. Return JSON only, ignore all non-body content."
+)
+_NOT_PLANNED = object()
+
+
+def _llm_segment_rules(chunk_tokens: int) -> List[str]:
+    return [
+        "Only consider paragraphs with label=body; drop every other label.",
+        "Keep the original order. You may merge adjacent items, but never reorder or skip any body paragraph.",
+        "Cover every body paragraph exactly once.",
+        f"Treat 'len' as tokens. Target ~{max(180, int(chunk_tokens))} tokens per segment.",
+        f"Hard limit: if a merge would exceed ~{int(max(180, chunk_tokens) * 1.25)} tokens, START A NEW SEGMENT.",
+        "Prefer 1-3 body paragraphs per segment; never exceed 6.",
+    ]
+
+
+def _llm_body_blocks(blocks: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """Body paragraphs worth planning with the LLM; None when there is nothing to merge."""
+    body_blocks = [b for b in blocks if (b.get("label", "body") == "body")]
+    if not body_blocks or len(body_blocks) <= 1:
+        return None
+    return body_blocks
+
+
+def _llm_block_lines(body_blocks: List[Dict[str, Any]]) -> List[str]:
+    """The paragraph listing the planner prompt shows for body_blocks."""
+    return [_summarize_block_for_llm(block, local_idx) for local_idx, block in enumerate(body_blocks)]
+
+
+def _parse_llm_plan(content: Any) -> Optional[Dict[str, Any]]:
+    if not content:
+        logging.warning("llm_segment_empty_response")
+        return None
+    if isinstance(content, str):
+        content = content.strip()
+    if not content:
+        return None
+    try:
+        return _json_loads(content)
+    except ValueError:
+        payload = _extract_json_object(content)
+        if payload is None:
+            logging.error("llm_segment_parse_json_failed preview=%s", content[:200])
+        return payload
+
+
+def _resolve_llm_plan(
+    raw_segments: Any,
+    text: str,
+    language: str,
+    body_blocks: List[Dict[str, Any]],
+    usePerplexity: bool,
+    useStylometry: bool,
+) -> Optional[List[Dict[str, Any]]]:
+    """Turn a paragraph_start/paragraph_end plan into segments; None unless it covers every body block in order."""
+    if not isinstance(raw_segments, list):
+        logging.error("llm_segment_invalid_segments_format")
+        return None
+
+    expected_idx = 0
+    all_resolved: List[Dict[str, Any]] = []
+    for entry in raw_segments:
+        try:
+            start_idx = int(entry.get("paragraph_start"))
+            end_idx = int(entry.get("paragraph_end"))
+        except Exception:
+            logging.error("llm_segment_invalid_index_format")
+            return None
+
+        if start_idx != expected_idx or end_idx < start_idx or end_idx >= len(body_blocks):
+            logging.error(
+                "llm_segment_invalid_index start=%s end=%s expected=%s max=%s",
+                start_idx,
+                end_idx,
+                expected_idx,
+                len(body_blocks) - 1,
+            )
+            return None
+
+        start_block = body_blocks[start_idx]
+        end_block = body_blocks[end_idx]
+
+        segment = _make_segment(
+            len(all_resolved),
+            language,
+            start_block["start"],
+            end_block["end"],
+            text[start_block["start"] : end_block["end"]],
+            usePerplexity=usePerplexity,
+            useStylometry=useStylometry,
+        )
+        all_resolved.append(segment)
+        expected_idx = end_idx + 1
+
+    if expected_idx != len(body_blocks):
+        logging.error(
+            "llm_segment_incomplete_coverage expected=%s actual=%s",
+            len(body_blocks),
+            expected_idx,
+        )
+        return None
+
+    logging.info("llm_segment_success segments=%s paragraphs=%s", len(all_resolved), len(body_blocks))
+    return all_resolved
+
+
 async def _build_segments_via_llm(
     text: str,
     language: str,
@@ -702,12 +945,14 @@ async def _build_segments_via_llm(
     chunk_tokens: int,
     usePerplexity: bool,
     useStylometry: bool,
+    api_key: Optional[str] = None,
+    block_lines: Optional[List[str]] = None,
 ) -> Optional[List[Dict[str, Any]]]:
-    api_key = getGLMKey()
+    api_key = api_key or getGLMKey()
     if not api_key:
         return None
-    body_blocks = [b for b in blocks if (b.get("label", "body") == "body")]
-    if not body_blocks or len(body_blocks) <= 1:
+    body_blocks = _llm_body_blocks(blocks)
+    if body_blocks is None:
         return None
     try:
         logging.info(
@@ -717,25 +962,11 @@ async def _build_segments_via_llm(
             len(blocks) - len(body_blocks),
         )
 
-        system_prompt = (
-            "You are a segmentation planner. Given a list of BODY paragraphs,"
-            " decide how to merge adjacent items. Return JSON only, ignore all non-body content."
-        )
-        rules = [
-            "Only consider paragraphs with label=body; drop every other label.",
-            "Keep the original order. You may merge adjacent items, but never reorder or skip any body paragraph.",
-            "Cover every body paragraph exactly once.",
-            f"Treat 'len' as tokens. Target ~{max(180, int(chunk_tokens))} tokens per segment.",
-            f"Hard limit: if a merge would exceed ~{int(max(180, chunk_tokens) * 1.25)} tokens, START A NEW SEGMENT.",
-            "Prefer 1-3 body paragraphs per segment; never exceed 6.",
+        rules = _llm_segment_rules(chunk_tokens) + [
             'Return JSON only: {"segments":[{"chunk_id":0,"paragraph_start":0,"paragraph_end":2}]}; chunk_id starts at 0 and increases by 1.',
         ]
-
-        block_lines: List[str] = []
-        block_map: Dict[int, Dict[str, Any]] = {}
-        for local_idx, block in enumerate(body_blocks):
-            block_lines.append(_summarize_block_for_llm(block, local_idx))
-            block_map[local_idx] = block
+        if block_lines is None:
+            block_lines = _llm_block_lines(body_blocks)
 
         user_prompt = (
             f"Below are {len(body_blocks)} BODY paragraphs, indexed from 0.\n"
@@ -747,87 +978,209 @@ async def _build_segments_via_llm(
         plan = await callGLMChat(
             "glm-4.6",
             api_key,
-            system_prompt,
+            _LLM_SEGMENT_SYSTEM_PROMPT,
             user_prompt,
-            max_tokens=1600,
+            max_tokens=LLM_SEGMENT_REPLY_TOKENS,
             enable_reasoning=True,
         )
-        content = (plan or {}).get("content")
-        if not content:
-            logging.warning("llm_segment_empty_response")
-            return None
-        if isinstance(content, str):
-            content = content.strip()
-        if not content:
+        payload = _parse_llm_plan((plan or {}).get("content"))
+        if payload is None:
             return None
+        return _resolve_llm_plan(payload.get("segments"), text, language, body_blocks, usePerplexity, useStylometry)
+    except Exception:
+        logging.exception("llm_segment_unhandled_error")
+        return None
 
-        payload = None
-        try:
-            payload = json.loads(content)
-        except json.JSONDecodeError:
-            match = _LLM_SEGMENT_JSON_RE.search(content)
-            if match:
-                try:
-                    payload = json.loads(match.group(0))
-                except json.JSONDecodeError:
-                    payload = None
-            if payload is None:
-                logging.error("llm_segment_parse_json_failed preview=%s", content[:200])
-                return None
-
-        raw_segments = payload.get("segments")
-        if not isinstance(raw_segments, list):
-            logging.error("llm_segment_invalid_segments_format")
-            return None
 
-        expected_idx = 0
-        all_resolved: List[Dict[str, Any]] = []
-        for entry in raw_segments:
+async def _build_segments_via_llm_group(
+    docs: List[Tuple[str, str, List[Dict[str, Any]], List[str]]],
+    chunk_tokens: int,
+    usePerplexity: bool,
+    useStylometry: bool,
+    limit: asyncio.Semaphore,
+) -> List[Optional[List[Dict[str, Any]]]]:
+    """Plan several documents sharing one chunk size with a single GLM call.
+
+    Each doc is (text, language, body blocks, listing lines from _llm_block_lines).
+    Every document is fenced with ``--- DOC i ---`` and the rules are sent once.
+    Documents the reply leaves out or plans invalidly get their own call.
+    Every call, the retries included, holds a slot of ``limit``.
+    """
+    api_key = getGLMKey()
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(docs)
+    try:
+        rules = _llm_segment_rules(chunk_tokens) + [
+            "Paragraph indices restart at 0 inside every DOC; plan each DOC independently.",
+            'Return JSON only: {"docs":[{"doc_id":0,"segments":[{"chunk_id":0,"paragraph_start":0,"paragraph_end":2}]}]};'
+            " include every DOC; chunk_id starts at 0 and increases by 1 within each DOC.",
+        ]
+        fences = []
+        for doc_id, (_, _, body_blocks, lines) in enumerate(docs):
+            fences.append(f"--- DOC {doc_id} ({len(body_blocks)} BODY paragraphs) ---\n" + "\n".join(lines))
+        user_prompt = (
+            f"Below are {len(docs)} documents, each a list of BODY paragraphs indexed from 0.\n"
+            + "\n".join(f"- {rule}" for rule in rules)
+            + "\n\n"
+            + "\n\n".join(fences)
+        )
+        logging.info("llm_segment_batch docs=%s prompt_tokens=%s", len(docs), estimateTokens(user_prompt))
+
+        async with limit:
+            plan = await callGLMChat(
+                "glm-4.6",
+                api_key,
+                _LLM_SEGMENT_SYSTEM_PROMPT,
+                user_prompt,
+                max_tokens=LLM_SEGMENT_REPLY_TOKENS * len(docs),
+                enable_reasoning=True,
+            )
+        payload = _parse_llm_plan((plan or {}).get("content"))
+        for entry in (payload or {}).get("docs") or []:
             try:
-                start_idx = int(entry.get("paragraph_start"))
-                end_idx = int(entry.get("paragraph_end"))
+                doc_id = int(entry.get("doc_id"))
             except Exception:
-                logging.error("llm_segment_invalid_index_format")
-                return None
-
-            if start_idx != expected_idx or end_idx < start_idx or end_idx >= len(body_blocks):
-                logging.error(
-                    "llm_segment_invalid_index start=%s end=%s expected=%s max=%s",
-                    start_idx,
-                    end_idx,
-                    expected_idx,
-                    len(body_blocks) - 1,
+                continue
+            if 0 <= doc_id < len(docs) and results[doc_id] is None:
+                text, language, body_blocks, _ = docs[doc_id]
+                results[doc_id] = _resolve_llm_plan(
+                    entry.get("segments"), text, language, body_blocks, usePerplexity, useStylometry
                 )
-                return None
+    except Exception:
+        logging.exception("llm_segment_batch_unhandled_error")
 
-            start_block = block_map[start_idx]
-            end_block = block_map[end_idx]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        logging.info("llm_segment_batch_fallback docs=%s", len(missing))
 
-            segment = _make_segment(
-                len(all_resolved),
-                language,
-                start_block["start"],
-                end_block["end"],
-                text[start_block["start"] : end_block["end"]],
-                usePerplexity=usePerplexity,
-                useStylometry=useStylometry,
-            )
-            all_resolved.append(segment)
-            expected_idx = end_idx + 1
+        async def retry(i: int) -> Optional[List[Dict[str, Any]]]:
+            async with limit:
+                text, language, body_blocks, lines = docs[i]
+                return await _build_segments_via_llm(
+                    text, language, body_blocks, chunk_tokens, usePerplexity, useStylometry, block_lines=lines
+                )
 
-        if expected_idx != len(body_blocks):
-            logging.error(
-                "llm_segment_incomplete_coverage expected=%s actual=%s",
-                len(body_blocks),
-                expected_idx,
-            )
-            return None
+        retried = await asyncio.gather(*(retry(i) for i in missing))
+        for i, r in zip(missing, retried):
+            results[i] = r
+    return results
+
+
+# (doc index, normalized text, language, body blocks, listing lines)
+_BatchMember = Tuple[int, str, str, List[Dict[str, Any]], List[str]]
+# (normalized text, detect blocks, chunk tokens, overlap tokens), as _prepare_detect_input returns it
+_DetectInput = Tuple[str, List[Dict[str, Any]], int, int]
+# (detect input, body blocks, listing lines); the last two are None when the doc is planned locally
+_PreparedDoc = Tuple[_DetectInput, Optional[List[Dict[str, Any]]], Optional[List[str]]]
+
+
+def _pack_llm_groups(members: List[_BatchMember]) -> List[List[_BatchMember]]:
+    """Split one group into prompts whose listing and expected reply both fit a single call."""
+    packs: List[List[_BatchMember]] = []
+    current: List[_BatchMember] = []
+    current_tokens = 0
+    for member in members:
+        tokens = sum(estimateTokens(line) for line in member[4])
+        if current and (len(current) >= LLM_SEGMENT_BATCH_MAX_DOCS or current_tokens + tokens > LLM_SEGMENT_BATCH_MAX_TOKENS):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(member)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def prepare_batch_inputs(docs: List[Dict[str, Any]]) -> List[_PreparedDoc]:
+    """Normalize and block every doc of a batch once, with its LLM listing.
+
+    CPU-bound; callers run it off the event loop (asyncio.to_thread) and hand
+    each doc's detect input to detect_async(prepared_input=...) afterwards.
+    """
+    prepared: List[_PreparedDoc] = []
+    for doc in docs:
+        detect_input = _prepare_detect_input(
+            doc.get("text") or "", doc.get("chunkSizeTokens"), doc.get("overlapTokens"), doc.get("sensitivity", "medium")
+        )
+        body_blocks = _llm_body_blocks(detect_input[1])
+        lines = _llm_block_lines(body_blocks) if body_blocks is not None else None
+        prepared.append((detect_input, body_blocks, lines))
+    return prepared
+
+
+def start_llm_segments_batch(
+    docs: List[Dict[str, Any]], parallel: int = 4, prepared: Optional[List[_PreparedDoc]] = None
+) -> List["asyncio.Future[Any]"]:
+    """Start planning a batch of detect requests; one future per doc, resolving to its segment_plan.
+
+    Each doc carries detect_async's arguments (text, language, chunkSizeTokens,
+    overlapTokens, sensitivity, usePerplexity, useStylometry); ``prepared`` is
+    prepare_batch_inputs(docs), computed here when not given. Documents that
+    share a chunk size and feature flags are planned together, up to
+    LLM_SEGMENT_BATCH_MAX_DOCS per GLM call and while the paragraph listing
+    stays under LLM_SEGMENT_BATCH_MAX_TOKENS. At most ``parallel`` GLM calls
+    run at once. A future resolves to None when its doc should be planned
+    locally, so a failed call never fails the batch; cancelling every future
+    of a group stops its calls.
+    """
+    loop = asyncio.get_running_loop()
+    plans: List["asyncio.Future[Any]"] = [loop.create_future() for _ in docs]
+    if not getGLMKey():
+        for fut in plans:
+            fut.set_result(None)
+        return plans
+    if prepared is None:
+        prepared = prepare_batch_inputs(docs)
+    limit = asyncio.Semaphore(max(1, int(parallel or 4)))
+    groups: Dict[Tuple[int, bool, bool], List[_BatchMember]] = {}
+    for i, (doc, (detect_input, body_blocks, lines)) in enumerate(zip(docs, prepared)):
+        if body_blocks is None:
+            plans[i].set_result(None)
+            continue
+        normalized, _, chunk_tokens, _ = detect_input
+        key = (chunk_tokens, bool(doc.get("usePerplexity", True)), bool(doc.get("useStylometry", True)))
+        groups.setdefault(key, []).append((i, normalized, doc.get("language") or "zh-CN", body_blocks, lines))
 
-        logging.info("llm_segment_success segments=%s paragraphs=%s", len(all_resolved), len(body_blocks))
-        return all_resolved
-    except Exception:
-        logging.exception("llm_segment_unhandled_error")
-        return None
+    async def plan_pack(key, members) -> None:
+        chunk_tokens, use_ppl, use_style = key
+        try:
+            if len(members) > 1:
+                results = await _build_segments_via_llm_group(
+                    [(text, language, body, lines) for _, text, language, body, lines in members],
+                    chunk_tokens, use_ppl, use_style, limit,
+                )
+            else:
+                _, text, language, body, lines = members[0]
+                async with limit:
+                    results = [
+                        await _build_segments_via_llm(
+                            text, language, body, chunk_tokens, use_ppl, use_style, block_lines=lines
+                        )
+                    ]
+        except Exception:
+            logging.exception("llm_segment_batch_unhandled_error")
+            results = [None] * len(members)
+        for (i, *_), r in zip(members, results):
+            if not plans[i].done():
+                plans[i].set_result(r)
+
+    def stop_when_abandoned(task: "asyncio.Task[None]", futs: List["asyncio.Future[Any]"]) -> None:
+        def on_done(_fut) -> None:
+            if all(f.cancelled() for f in futs):
+                task.cancel()
+        for f in futs:
+            f.add_done_callback(on_done)
+
+    for key, members in groups.items():
+        for pack in _pack_llm_groups(members):
+            task = asyncio.ensure_future(plan_pack(key, pack))
+            stop_when_abandoned(task, [plans[member[0]] for member in pack])
+    return plans
+
+
+async def build_llm_segments_batch(docs: List[Dict[str, Any]], parallel: int = 4) -> List[Any]:
+    """LLM segment plans for a batch of detect requests, to hand to detect_async(segment_plan=...)."""
+    prepared = await asyncio.to_thread(prepare_batch_inputs, docs)
+    return list(await asyncio.gather(*start_llm_segments_batch(docs, parallel, prepared)))
 
 
 def buildSegments(
@@ -888,19 +1241,15 @@ def _split_segments_by_length(
             )
             continue
 
-        sentences = splitSentences(seg_text) or [seg_text]
-        cursor = 0
+        # 句子以原分段中的字符偏移给出，无需逐句切片再回查位置
+        spans = _sentence_spans(seg_text) or [(0, len(seg_text))]
         current_start = start
         current_tokens = 0
         buf_end = start
-        for sent in sentences:
-            # 定位句子在原分段中的真实位置，用于保持字符偏移
-            idx = seg_text.find(sent, cursor)
-            if idx < 0:
-                idx = cursor
-            sent_start = start + idx
-            sent_end = sent_start + len(sent)
-            sent_tokens = estimateTokens(sent)
+        for s_start, s_end in spans:
+            sent_start = start + s_start
+            sent_end = start + s_end
+            sent_tokens = estimateTokens(seg_text, s_start, s_end)
             # 当累积已超过 target，且加入将超过 1.1x target 硬帽时，结束当前分段
             if (current_tokens >= target and (current_tokens + sent_tokens) > int(target * 1.1)) or (
                 current_tokens + sent_tokens > hard_limit
@@ -921,7 +1270,6 @@ def _split_segments_by_length(
                     current_tokens = 0
             current_tokens += sent_tokens
             buf_end = sent_end
-            cursor = idx + len(sent)
         if buf_end > current_start:
             rebuilt.append(
                 _make_segment(
@@ -966,30 +1314,41 @@ FUNCTION_WORDS = {
 def _ngram_repeat_rate(tokens: List[str], n: int = 3) -> float:
     if len(tokens) < n + 1:
         return 0.0
-    counts: Dict[Tuple[str, ...], int] = {}
-    total = 0
-    for i in range(len(tokens) - n + 1):
-        key = tuple(tokens[i : i + n])
-        counts[key] = counts.get(key, 0) + 1
-        total += 1
-    repeats = sum(c - 1 for c in counts.values() if c >= 2)
-    return repeats / max(1, total)
+    total = len(tokens) - n + 1
+    # every occurrence of an n-gram beyond its first counts as a repeat
+    distinct = len(set(zip(*(tokens[i:] for i in range(n)))))
+    return (total - distinct) / total
+
+
+_EMPTY_STYLOMETRY: Dict[str, float] = {
+    "ttr": 0.0,
+    "avgSentenceLen": 0.0,
+    "functionWordRatio": 0.0,
+    "punctuationRatio": 0.0,
+    "repeatRatio": 0.0,
+    "ngramRepeatRate": 0.0,
+}
 
 
 def computeStylometryMetrics(text: str) -> Dict[str, float]:
-    tokens = re.findall(r"\w+|[\u4e00-\u9fff]", text or "")
-    unique = set(tokens)
-    ttr = (len(unique) / max(1, len(tokens))) if tokens else 0.0
-    sentences = splitSentences(text or "") or [text]
-    avg_sentence_len = sum(len(s) for s in sentences) / max(1, len(sentences))
-    function_ratio = sum(1 for t in tokens if t in FUNCTION_WORDS) / max(1, len(tokens))
-    punctuation_ratio = len(re.findall(r"[，。！？.!?]", text or "")) / max(1, len(text or ""))
-    repeats = 0.0
-    if tokens:
-        freq: Dict[str, int] = {}
-        for t in tokens:
-            freq[t] = freq.get(t, 0) + 1
-        repeats = sum(1 for v in freq.values() if v >= 3) / max(1, len(freq))
+    if not text:
+        return dict(_EMPTY_STYLOMETRY)
+    tokens = _WORD_TOKEN_RE.findall(text)
+    spans = _sentence_spans(text) or [(0, len(text))]
+    avg_sentence_len = sum(e - s for s, e in spans) / len(spans)
+    punctuation_ratio = len(_PUNCT_COUNT_RE.findall(text)) / len(text)
+    if not tokens:
+        # punctuation/whitespace only: every token-based ratio is 0
+        return {
+            **_EMPTY_STYLOMETRY,
+            "avgSentenceLen": round(avg_sentence_len, 2),
+            "punctuationRatio": round(punctuation_ratio, 4),
+        }
+    # one frequency table feeds TTR, function-word ratio and repeat ratio
+    freq = Counter(tokens)
+    ttr = len(freq) / len(tokens)
+    function_ratio = sum(c for t, c in freq.items() if t in FUNCTION_WORDS) / len(tokens)
+    repeats = sum(1 for v in freq.values() if v >= 3) / len(freq)
     ngram_rate = _ngram_repeat_rate(tokens, 3)
     return {
         "ttr": round(ttr, 4),
@@ -1002,19 +1361,21 @@ def computeStylometryMetrics(text: str) -> Dict[str, float]:
 
 
 def _estimate_perplexity(text: str) -> float:
-    tokens = re.findall(r"[A-Za-z0-9_]+|[\u4e00-\u9fff]", text or "")
-    if not tokens:
+    if not text:
+        return 120.0
+    # same tokens as _TOKEN_RE; CJK characters are counted straight from the runs
+    freq = Counter(_ASCII_WORD_RE.findall(text))
+    if not text.isascii():
+        freq.update("".join(_CJK_RUN_RE.findall(text)))
+    if not freq:
         return 120.0
-    freq: Dict[str, int] = {}
-    for t in tokens:
-        freq[t] = freq.get(t, 0) + 1
     total = sum(freq.values())
     probs = [c / total for c in freq.values()]
     entropy = -sum(p * math.log(p + 1e-12) for p in probs)
     ppl_uni = math.exp(entropy)
     ppl_scaled = 20.0 + min(280.0, (ppl_uni - 1.0) * 22.5)
     distinct = len(freq)
-    diversity = distinct / max(1, len(tokens))
+    diversity = distinct / total
     base_old = 120.0 - diversity * 60.0 + len(text) / 500.0
     val = 0.5 * ppl_scaled + 0.5 * base_old
     return round(max(20.0, min(300.0, val)), 2)
@@ -1097,70 +1458,109 @@ def _spread_flat_probs_by_length(segments: List[Dict[str, Any]]) -> None:
     n = len(lengths)
     if n <= 1:
         return
-    order = sorted(range(n), key=lambda i: lengths[i])
+    order = sorted(range(n), key=lengths.__getitem__)
+    denom = n - 1
     for rank, idx in enumerate(order):
-        prob = 0.10 + 0.80 * (rank / max(1, n - 1))
+        prob = 0.10 + 0.80 * (rank / denom)
         seg = segments[idx]
         lj = seg.get("signals", {}).get("llmJudgment") or {}
         lj["prob"] = prob
         seg.setdefault("signals", {})["llmJudgment"] = lj
         seg.setdefault("explanations", []).append("llm_flat_respread_by_len")
+
+
+def _pvariance(values: List[float]) -> float:
+    # float population variance; the statistics module is exact but goes through Fractions
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean = math.fsum(values) / n
+    return math.fsum((v - mean) * (v - mean) for v in values) / n
+
+
+def _pstdev(values: List[float]) -> float:
+    return math.sqrt(_pvariance(values))
+
+
 def _logit_safe(p: float) -> float:
     p = max(1e-6, min(1.0 - 1e-6, float(p)))
     return math.log(p / (1.0 - p))
 
 
-def _mean_after_shift(logits: List[float], c: float) -> float:
+def _sigmoid_clamped(x: float, _exp=math.exp) -> float:
     # 防止 math.exp 溢出，使用带上限的 sigmoid
-    def _sigmoid_clamped(x: float) -> float:
-        if x > 40:
-            return 1.0
-        if x < -40:
-            return 0.0
-        return 1.0 / (1.0 + math.exp(-x))
+    if x > 40:
+        return 1.0
+    if x < -40:
+        return 0.0
+    return 1.0 / (1.0 + _exp(-x))
+
+
+def _solve_shift(
+    logits: List[float], target: float, lo: float = -6.0, hi: float = 6.0
+) -> Tuple[float, List[float]]:
+    """Find c in [lo, hi] with mean(sigmoid(l - c)) == target; returns (c, sigmoids at c).
+
+    Safeguarded Newton: the mean is decreasing in c, so each evaluation also
+    tightens the bracket, and a step that leaves it falls back to bisection.
+    Converges in a handful of passes where plain bisection needs ~25; a root
+    outside the bracket ends at the nearer bound, as bisection did. The
+    sigmoids of the last evaluation are handed back so callers need not
+    recompute them.
+    """
+    n = max(1, len(logits))
+    c = min(hi, max(lo, 0.0))
+    for _ in range(40):
+        sig = [_sigmoid_clamped(l - c) for l in logits]
+        diff = sum(sig) / n - target
+        if abs(diff) < 1e-12:
+            break
+        if diff > 0:
+            lo = c
+        else:
+            hi = c
+        if hi - lo < 1e-9:
+            break
+        slope = sum(si * (1.0 - si) for si in sig) / n
+        step = c + diff / slope if slope > 1e-12 else lo - 1.0
+        c = step if lo < step < hi else (lo + hi) / 2.0
+    else:
+        # iteration cap reached after moving c: evaluate once more at the final shift
+        sig = [_sigmoid_clamped(l - c) for l in logits]
+    return c, sig
+
 
-    return sum(_sigmoid_clamped(l - c) for l in logits) / max(1, len(logits))
+def _rank_quartiles(values: List[float]) -> Tuple[float, float, float]:
+    """(q1, median, q3) by index into one sorted copy; no interpolation."""
+    sv = sorted(values)
+    n = len(sv)
+    return sv[n // 4], sv[n // 2], sv[(n * 3) // 4]
 
 
 def _contrast_sharpen_segments(segments: List[Dict[str, Any]], sensitivity: str) -> None:
     if len(segments) < 4:
         return
     probs = [s["aiProbability"] for s in segments]
-    sv = sorted(probs)
-    median = sv[len(sv) // 2]
-    q1, q3 = sv[len(sv) // 4], sv[(len(sv) * 3) // 4]
+    q1, median, q3 = _rank_quartiles(probs)
     iqr = max(1e-6, q3 - q1)
-    z = [(p - median) / (iqr / 1.349) for p in probs]
+    z_scale = iqr / 1.349
 
-    doc_std = statistics.pstdev(probs) if len(probs) > 1 else 0.0
+    doc_std = _pstdev(probs)
     base_gamma = {"low": 1.10, "medium": 1.45, "high": 1.75}.get((sensitivity or "medium").lower(), 1.45)
     flat_boost = 1.0 + max(0.0, (0.06 - doc_std) * 10.0)
     gamma = min(2.5, base_gamma * flat_boost)
 
-    logits = [_logit_safe(p) for p in probs]
-    confs = [s.get("confidence", 0.6) for s in segments]
-    logits_prime = [l + gamma * z_i * (0.6 + 0.4 * max(0.3, min(0.92, c))) for l, z_i, c in zip(logits, z, confs)]
+    # z-score, logit and confidence-weighted push in one pass over the segments
+    logits_prime = [
+        _logit_safe(p) + gamma * ((p - median) / z_scale) * (0.6 + 0.4 * max(0.3, min(0.92, s.get("confidence", 0.6))))
+        for p, s in zip(probs, segments)
+    ]
 
     target_mean = sum(probs) / len(probs)
-    lo, hi = -6.0, 6.0
-    for _ in range(28):
-        mid = (lo + hi) / 2.0
-        m = _mean_after_shift(logits_prime, mid)
-        if m > target_mean:
-            lo = mid
-        else:
-            hi = mid
-    c = (lo + hi) / 2.0
-
-    for seg, lp in zip(segments, logits_prime):
-        # 与 _mean_after_shift 保持一致的带限幅 sigmoid
-        x = lp - c
-        if x > 40:
-            new_p = 1.0
-        elif x < -40:
-            new_p = 0.0
-        else:
-            new_p = 1.0 / (1.0 + math.exp(-x))
+    _, shifted = _solve_shift(logits_prime, target_mean)
+
+    for seg, new_p in zip(segments, shifted):
+        # shifted 即 _solve_shift 最终 c 处的带限幅 sigmoid
         if seg.get("confidence", 0.6) < 0.5:
             new_p = 0.8 * seg["aiProbability"] + 0.2 * new_p
         seg["aiProbability"] = max(0.02, min(0.98, new_p))
@@ -1169,47 +1569,24 @@ def _contrast_sharpen_segments(segments: List[Dict[str, Any]], sensitivity: str)
 
     # 如果仍然平坦，再进行一次加大力度的对比度调整（保持均值）
     try:
-        std_after = statistics.pstdev([s["aiProbability"] for s in segments]) if len(segments) > 1 else 0.0
-        if std_after < 0.05 and len(segments) >= 4:
-            probs2 = [s["aiProbability"] for s in segments]
-            sv2 = sorted(probs2)
-            median2 = sv2[len(sv2) // 2]
-            q12, q32 = sv2[len(sv2) // 4], sv2[(len(sv2) * 3) // 4]
+        # the boost works on the sharpened values, so its quartiles are taken afresh
+        probs2 = [s["aiProbability"] for s in segments]
+        std_after = _pstdev(probs2)
+        if std_after < 0.05:
+            q12, median2, q32 = _rank_quartiles(probs2)
             iqr2 = max(1e-6, q32 - q12)
-            z2 = [(p - median2) / (iqr2 / 1.349) for p in probs2]
-            logits2 = [_logit_safe(p) for p in probs2]
+            z_scale2 = iqr2 / 1.349
             gamma2 = min(3.0, base_gamma * 1.6)
-            logits2_prime = [l + gamma2 * z_i for l, z_i in zip(logits2, z2)]
+            logits2_prime = [_logit_safe(p) + gamma2 * ((p - median2) / z_scale2) for p in probs2]
             target_mean2 = sum(probs2) / len(probs2)
-            lo2, hi2 = -6.0, 6.0
-            for _ in range(22):
-                mid2 = (lo2 + hi2) / 2.0
-                m2 = _mean_after_shift(logits2_prime, mid2)
-                if m2 > target_mean2:
-                    lo2 = mid2
-                else:
-                    hi2 = mid2
-            c2 = (lo2 + hi2) / 2.0
-            for seg, lp2 in zip(segments, logits2_prime):
-                x2 = lp2 - c2
-                if x2 > 40:
-                    new_p2 = 1.0
-                elif x2 < -40:
-                    new_p2 = 0.0
-                else:
-                    new_p2 = 1.0 / (1.0 + math.exp(-x2))
+            _, shifted2 = _solve_shift(logits2_prime, target_mean2)
+            for seg, new_p2 in zip(segments, shifted2):
                 seg["aiProbability"] = max(0.02, min(0.98, new_p2))
                 seg.setdefault("explanations", []).append("contrastSharpening(boost)")
     except Exception:
         pass
 
 
-def _std(values: List[float]) -> float:
-    if not values:
-        return 0.0
-    return statistics.pstdev(values)
-
-
 # ---------------------------------------------------------------------------
 # Aggregation and calibration
 # ---------------------------------------------------------------------------
@@ -1236,37 +1613,46 @@ _calibration: Dict[str, Any] = {
 }
 
 
+# Shared by every aggregation and getRubricInfo; callers get their own copies.
+_THRESHOLDS: Dict[str, float] = {"low": 0.65, "medium": 0.75, "high": 0.85, "veryHigh": 0.90}
+_BLOCK_WEIGHTS: Dict[str, float] = {"stylometry": 0.4, "quality": 0.6}
+_FIXED_DIMENSION_SCORES: Dict[str, int] = {"contentRelevance": 4, "logicalCoherence": 4, "originality": 3}
+
+
 def aggregateSegments(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
     if not segments:
         return {
             "overallProbability": 0.0,
             "overallConfidence": 0.0,
             "method": "weighted",
-            "thresholds": {"low": 0.65, "medium": 0.75, "high": 0.85, "veryHigh": 0.90},
+            "thresholds": dict(_THRESHOLDS),
             "rubricVersion": _rubric_version,
             "bufferMargin": DEFAULT_BUFFER_MARGIN,
             "decision": "pass",
         }
-    weights = [max(50, seg["offsets"]["end"] - seg["offsets"]["start"]) for seg in segments]
-    total = sum(weights)
-    overall = sum(seg["aiProbability"] * w for seg, w in zip(segments, weights)) / max(1, total)
-    confidence = sum(seg["confidence"] * w for seg, w in zip(segments, weights)) / max(1, total)
+    # one pass accumulates the length weights and both weighted sums
+    total = 0
+    prob_sum = 0.0
+    conf_sum = 0.0
+    for seg in segments:
+        offsets = seg["offsets"]
+        w = max(50, offsets["end"] - offsets["start"])
+        total += w
+        prob_sum += seg["aiProbability"] * w
+        conf_sum += seg["confidence"] * w
+    overall = prob_sum / max(1, total)
+    confidence = conf_sum / max(1, total)
     return {
         "overallProbability": max(0.0, min(1.0, overall)),
         "overallConfidence": max(0.0, min(1.0, confidence)),
         "method": "weighted",
-        "thresholds": {"low": 0.65, "medium": 0.75, "high": 0.85, "veryHigh": 0.90},
+        "thresholds": dict(_THRESHOLDS),
         "rubricVersion": _rubric_version,
         "bufferMargin": DEFAULT_BUFFER_MARGIN,
         "stylometryProbability": overall,
         "qualityScoreNormalized": 0.5 + (confidence - 0.5) * 0.6,
-        "blockWeights": {"stylometry": 0.4, "quality": 0.6},
-        "dimensionScores": {
-            "grammarAccuracy": int(confidence * 10) % 5 + 1,
-            "contentRelevance": 4,
-            "logicalCoherence": 4,
-            "originality": 3,
-        },
+        "blockWeights": dict(_BLOCK_WEIGHTS),
+        "dimensionScores": {"grammarAccuracy": int(confidence * 10) % 5 + 1, **_FIXED_DIMENSION_SCORES},
     }
 
 
@@ -1295,11 +1681,25 @@ def setCalibration(items: List[Dict[str, Any]]) -> None:
 
 
 def applyCalibration(prob: float) -> float:
+    return applyCalibrationMany((prob,))[0]
+
+
+def applyCalibrationMany(probs: Iterable[float]) -> List[float]:
+    """Platt-style calibration over many probabilities.
+
+    (A, B) of the current version are looked up once per call; _calibration is
+    exported and may be changed from outside, so nothing is cached across calls.
+    """
     cfg = _calibration["byVersion"].get(_calibration["current"], {"A": 1.0, "B": 0.0})
-    clipped = max(1e-6, min(1 - 1e-6, prob))
-    logit = math.log(clipped / (1 - clipped))
-    adjusted = 1 / (1 + math.exp(-(cfg.get("A", 1.0) * logit + cfg.get("B", 0.0))))
-    return max(0.0, min(1.0, adjusted))
+    a, b = cfg.get("A", 1.0), cfg.get("B", 0.0)
+    log, exp = math.log, math.exp
+    out: List[float] = []
+    append = out.append
+    for prob in probs:
+        clipped = max(1e-6, min(1 - 1e-6, prob))
+        adjusted = 1 / (1 + exp(-(a * log(clipped / (1 - clipped)) + b)))
+        append(max(0.0, min(1.0, adjusted)))
+    return out
 
 
 def getRubricInfo() -> Dict[str, Any]:
@@ -1315,8 +1715,8 @@ def getRubricInfo() -> Dict[str, Any]:
             "originality": 0.1,
             "readability": 0.1,
         },
-        "blockWeights": {"stylometry": 0.4, "quality": 0.6},
-        "thresholds": {"low": 0.65, "medium": 0.75, "high": 0.85, "veryHigh": 0.90},
+        "blockWeights": dict(_BLOCK_WEIGHTS),
+        "thresholds": dict(_THRESHOLDS),
     }
 
 
@@ -1364,6 +1764,8 @@ async def paper_analyze(
     glm_key = getGLMKey()
     template = "glm" if (use_llm and glm_key) else "heuristic"
     details = []
+    # all rounds belong to the same analysis run and share its start time
+    ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
     for i in range(max(1, rounds)):
         jitter = math.sin(i + 1) * 0.03
         prob = max(0.02, min(0.98, base_prob + jitter))
@@ -1374,7 +1776,7 @@ async def paper_analyze(
                 "probability": prob,
                 "confidence": min(0.95, confidence),
                 "templateId": template,
-                "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+                "ts": ts,
             }
         )
     avg_prob = sum(d["probability"] for d in details) / len(details)
@@ -1394,244 +1796,313 @@ async def paper_analyze(
 # Provider orchestration
 # ---------------------------------------------------------------------------
 
-async def _run_llm_judgment(segments: List[Dict[str, Any]], providers: Optional[List[str]]) -> Dict[str, int]:
-    if not providers:
-        return {"calls": 0, "success": 0, "latencyMs": 0}
-    glm_key = getGLMKey()
-    pre_local = {seg["chunkId"]: float(seg["aiProbability"]) for seg in segments}
+LLM_JUDGMENT_MAX_CONCURRENCY = 4
+
+
+def _start_call(sem: asyncio.Semaphore, idx: int, call: Any) -> "asyncio.Task[Tuple[int, Any]]":
+    """Schedule a provider call right away; the task resolves to (idx, result or exception).
+
+    Starting each call as soon as it is built lets the first request go out
+    while later ones are still being prepared; ``sem`` bounds how many run.
+    """
+
+    async def run() -> Tuple[int, Any]:
+        async with sem:
+            try:
+                return idx, await call
+            except Exception as exc:
+                return idx, exc
+
+    task = asyncio.create_task(run())
+    # a call cancelled while still waiting on ``sem`` never started; close it so it is not reported as unawaited
+    task.add_done_callback(lambda t: call.close() if t.cancelled() else None)
+    return task
+
+
+async def _iter_completed(tasks: List["asyncio.Task[Tuple[int, Any]]"]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (index, result or exception) as the started calls finish."""
+    for fut in asyncio.as_completed(tasks):
+        yield await fut
+
+
+async def _cancel_pending(tasks: List["asyncio.Task[Tuple[int, Any]]"]) -> None:
+    """Cancel the calls still running and wait for them to wind down.
+
+    The runners call this on the way out, so a cancelled or failing detection
+    does not leave judgment requests running in the background.
+    """
+    pending = [t for t in tasks if not t.done()]
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _apply_llm_judgment(
+    by_id: Dict[int, List[Dict[str, Any]]],
+    written: Dict[int, int],
+    idx: int,
+    updates: List[Any],
+    model: str,
+    result: Any,
+) -> None:
+    """Write one provider's probabilities onto its segments.
+
+    Results arrive in completion order; ``written`` remembers which provider
+    index last set each chunk so the later provider in the list still wins,
+    as when every reply was applied in provider order.
+    """
+    for item in updates:
+        try:
+            chunk_id = int(item.get("chunk_id"))
+            prob = float(item.get("ai_probability", 0.5))
+        except Exception:
+            continue
+        if written.get(chunk_id, -1) > idx:
+            continue
+        written[chunk_id] = idx
+        for seg in by_id.get(chunk_id, ()):
+            seg["signals"]["llmJudgment"] = {
+                "prob": prob,
+                "models": [model],
+                "reasoning": result.get("reasoning") if isinstance(result, dict) else None,
+            }
+
+
+def _judgment_payload(segments: List[Dict[str, Any]]) -> str:
+    """Feature payload sent to every judgment model; the same for all of them."""
+    items = []
+    for seg in segments:
+        sty = seg["signals"]["stylometry"]
+        items.append(
+            {
+                "chunk_id": seg["chunkId"],
+                "ttr": sty["ttr"],
+                "avg_sentence_len": sty["avgSentenceLen"],
+                "repeat_ratio": sty["repeatRatio"],
+                # 提供给模型作为提示，不要求完全依赖
+                "baseline_prob": round(seg["aiProbability"], 4),
+            }
+        )
+    return _json_dumps({"segments": items}).decode("utf-8")
+
+
+def _segments_by_chunk_id(segments: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    by_id: Dict[int, List[Dict[str, Any]]] = {}
+    for seg in segments:
+        by_id.setdefault(seg["chunkId"], []).append(seg)
+    return by_id
+
+
+@lru_cache(maxsize=64)
+def _provider_name_model(spec: str) -> Tuple[Optional[str], str]:
+    """(name, model) of a provider spec; the same few specs recur on every request."""
+    info = parseProvider(spec)
+    return info.get("name"), info.get("model") or ""
+
+
+_JUDGMENT_SYSTEM_PROMPT = (
+    "You are an independent classifier. Re-evaluate AI probability for each segment using the features. "
+    "IGNORE the baseline_prob except as a loose hint; you may move far away from it. "
+    "Return ONLY JSON: {\"segments\":[{\"chunk_id\":<int>,\"ai_probability\":<0-1 float>}]} "
+    "with no markdown, no code fences, no reasoning text."
+)
+_JUDGMENT_SYSTEM_PROMPT_V2 = (
+    "You are an independent classifier. Re-evaluate AI probability for each segment using the features. "
+    "IGNORE baseline_prob except as a loose hint; you may move far away from it. "
+    "Probabilities should reflect differences between segments (avoid giving the same value to all). "
+    "Return ONLY JSON: {\"segments\":[{\"chunk_id\":<int>,\"ai_probability\":<0-1 float>}]} "
+    "with no markdown, no code fences, no reasoning text."
+)
+
+
+def _start_judgment_calls(
+    segments: List[Dict[str, Any]],
+    providers: List[str],
+    glm_key: Optional[str],
+    system_prompt: str,
+    missing_key_message: str,
+) -> Tuple[List["asyncio.Task"], List[str]]:
+    """Start one judgment call per distinct GLM model in providers; returns (tasks, models)."""
     tasks = []
     models: List[str] = []
+    sem = asyncio.Semaphore(LLM_JUDGMENT_MAX_CONCURRENCY)
+    seen_models = set()
+    user_prompt: Optional[str] = None
     for spec in providers:
-        info = parseProvider(spec)
-        if info.get("name") == "glm":
+        name, model = _provider_name_model(spec)
+        if name == "glm":
             if not glm_key:
-                raise RuntimeError("GLM API Key 未配置")
-            payload = {
-                "segments": [
-                    {
-                        "chunk_id": seg["chunkId"],
-                        "ttr": seg["signals"]["stylometry"]["ttr"],
-                        "avg_sentence_len": seg["signals"]["stylometry"]["avgSentenceLen"],
-                        "repeat_ratio": seg["signals"]["stylometry"]["repeatRatio"],
-                        # 提供给模型作为提示，不要求完全依赖
-                        "baseline_prob": round(seg["aiProbability"], 4),
-                    }
-                    for seg in segments
-                ]
-            }
-            system_prompt = (
-                "You are an independent classifier. Re-evaluate AI probability for each segment using the features. "
-                "IGNORE the baseline_prob except as a loose hint; you may move far away from it. "
-                "Return ONLY JSON: {\"segments\":[{\"chunk_id\":<int>,\"ai_probability\":<0-1 float>}]} "
-                "with no markdown, no code fences, no reasoning text."
-            )
-            model = info.get("model") or "glm-4.6"
+                raise RuntimeError(missing_key_message)
+            model = model or "glm-4.6"
+            # every call sends the same segments, so a repeated model would only redo the same request
+            if model in seen_models:
+                continue
+            seen_models.add(model)
+            if user_prompt is None:
+                user_prompt = _judgment_payload(segments)
             tasks.append(
-                callGLMChat(
-                    model,
-                    glm_key,
-                    system_prompt,
-                    json.dumps(payload, ensure_ascii=False),
-                    max_tokens=4096,
-                    enable_reasoning=False,
-                    reasoning_effort="high",
+                _start_call(
+                    sem,
+                    len(tasks),
+                    callGLMChat(
+                        model,
+                        glm_key,
+                        system_prompt,
+                        user_prompt,
+                        max_tokens=4096,
+                        enable_reasoning=False,
+                        reasoning_effort="high",
+                    ),
                 )
             )
             models.append(model)
+    return tasks, models
+
+
+async def _run_llm_judgment(
+    segments: List[Dict[str, Any]], providers: Optional[List[str]], glm_key: Optional[str] = None
+) -> Dict[str, int]:
+    if not providers:
+        return {"calls": 0, "success": 0, "latencyMs": 0}
+    glm_key = glm_key or getGLMKey()
+    # local probabilities before fusion, index-aligned with segments
+    pre_local = [float(seg["aiProbability"]) for seg in segments]
+    tasks, models = _start_judgment_calls(segments, providers, glm_key, _JUDGMENT_SYSTEM_PROMPT, "GLM API Key 未配置")
     if not tasks:
         return {"calls": 0, "success": 0, "latencyMs": 0}
-    results = await asyncio.gather(*tasks, return_exceptions=True)
     stats = {"calls": len(tasks), "success": 0, "latencyMs": 0}
     errors: List[str] = []
-    for idx, result in enumerate(results):
-        model = models[idx] if idx < len(models) else "glm-4.6"
-        if isinstance(result, Exception) or not result:
-            errors.append(str(result))
-            continue
-        stats["success"] += 1
-        try:
-            stats["latencyMs"] += int(result.get("latency_ms", 0)) if isinstance(result, dict) else 0
-        except Exception:
-            pass
-        data = result.get("content") if isinstance(result, dict) else None
-        if not data:
-            errors.append("空响应")
-            continue
-        try:
-            parsed = json.loads(data)
-        except json.JSONDecodeError as exc:
-            errors.append(f"解析失败:{exc}")
-            continue
-        updates = parsed.get("segments") if isinstance(parsed, dict) else parsed
-        if not isinstance(updates, list):
-            errors.append("响应缺少 segments 数组")
-            continue
-        for item in updates:
+    by_id = _segments_by_chunk_id(segments)
+    written: Dict[int, int] = {}
+    try:
+        # replies are parsed and applied as they arrive instead of after the slowest one
+        async for idx, result in _iter_completed(tasks):
+            model = models[idx] if idx < len(models) else "glm-4.6"
+            if isinstance(result, Exception) or not result:
+                errors.append(str(result))
+                continue
+            stats["success"] += 1
             try:
-                chunk_id = int(item.get("chunk_id"))
-                prob = float(item.get("ai_probability", 0.5))
+                stats["latencyMs"] += int(result.get("latency_ms", 0)) if isinstance(result, dict) else 0
             except Exception:
+                pass
+            data = result.get("content") if isinstance(result, dict) else None
+            if not data:
+                errors.append("空响应")
                 continue
-            for seg in segments:
-                if seg["chunkId"] == chunk_id:
-                    seg["signals"]["llmJudgment"] = {
-                        "prob": prob,
-                        "models": [model],
-                        "reasoning": result.get("reasoning") if isinstance(result, dict) else None,
-                    }
+            try:
+                parsed = _json_loads(data)
+            except ValueError as exc:
+                errors.append(f"解析失败:{exc}")
+                continue
+            updates = parsed.get("segments") if isinstance(parsed, dict) else parsed
+            if not isinstance(updates, list):
+                errors.append("响应缺少 segments 数组")
+                continue
+            _apply_llm_judgment(by_id, written, idx, updates, model, result)
+    finally:
+        await _cancel_pending(tasks)
     if stats["success"] == 0:
         raise RuntimeError(f"GLM 判别全部失败：{'; '.join(errors) if errors else '未知错误'}")
     # [VAR-SPREAD-ADAPT-FUSE] 根据方差自适应融合 LLM 与本地概率
     try:
-        import statistics
         llm_probs: List[float] = []
         local_probs: List[float] = []
-        for seg in segments:
+        for seg, base in zip(segments, pre_local):
             lp = seg.get("signals", {}).get("llmJudgment", {}).get("prob")
             if lp is not None:
                 llm_probs.append(float(lp))
-                local_probs.append(float(pre_local.get(seg["chunkId"], seg.get("aiProbability", 0.5))))
-        if llm_probs and statistics.pvariance(llm_probs) < 0.02:
+                local_probs.append(base)
+        if llm_probs and _pvariance(llm_probs) < 0.02:
             _spread_flat_probs_by_length(segments)
             llm_probs = [float(seg.get("signals", {}).get("llmJudgment", {}).get("prob", lp)) for seg, lp in zip(segments, llm_probs)]
         if llm_probs:
-            var_llm = statistics.pvariance(llm_probs) if len(llm_probs) > 1 else 0.0
-            var_local = statistics.pvariance(local_probs) if len(local_probs) > 1 else 0.0
+            var_llm = _pvariance(llm_probs)
+            var_local = _pvariance(local_probs)
             w = 0.30 + 0.25 * (var_llm / max(1e-9, (var_llm + var_local)))
             w = max(0.20, min(0.55, w))
-            for seg in segments:
+            # w is fixed for the pass, so every fused segment gets the same note
+            note = f"llmAdaptiveFusion(w={w:.2f})"
+            for seg, base in zip(segments, pre_local):
                 lp = seg.get("signals", {}).get("llmJudgment", {}).get("prob")
                 if lp is None:
                     continue
-                base = float(pre_local.get(seg["chunkId"], seg.get("aiProbability", 0.5)))
                 fused = base * (1.0 - w) + float(lp) * w
                 seg["aiProbability"] = max(0.02, min(0.98, fused))
-                seg.setdefault("explanations", []).append(f"llmAdaptiveFusion(w={w:.2f})")
+                seg.setdefault("explanations", []).append(note)
     except Exception:
         pass
     return stats
 
 
-async def _run_llm_judgment_v2(segments: List[Dict[str, Any]], providers: Optional[List[str]]) -> Dict[str, int]:
+async def _run_llm_judgment_v2(
+    segments: List[Dict[str, Any]], providers: Optional[List[str]], glm_key: Optional[str] = None
+) -> Dict[str, int]:
     """
     更安全的 LLM 判别：含有 baseline_prob 约束但不完全依赖本地结果。
     """
     if not providers:
         return {"calls": 0, "success": 0, "latencyMs": 0}
-    glm_key = getGLMKey()
-    pre_local = {seg["chunkId"]: float(seg["aiProbability"]) for seg in segments}
-    tasks = []
-    models: List[str] = []
-    for spec in providers:
-        info = parseProvider(spec)
-        if info.get("name") == "glm":
-            if not glm_key:
-                raise RuntimeError("GLM API Key 缺失")
-            payload = {
-                "segments": [
-                    {
-                        "chunk_id": seg["chunkId"],
-                        "ttr": seg["signals"]["stylometry"]["ttr"],
-                        "avg_sentence_len": seg["signals"]["stylometry"]["avgSentenceLen"],
-                        "repeat_ratio": seg["signals"]["stylometry"]["repeatRatio"],
-                        "baseline_prob": round(seg["aiProbability"], 4),
-                    }
-                    for seg in segments
-                ]
-            }
-            system_prompt = (
-                "You are an independent classifier. Re-evaluate AI probability for each segment using the features. "
-                "IGNORE baseline_prob except as a loose hint; you may move far away from it. "
-                "Probabilities should reflect differences between segments (avoid giving the same value to all). "
-                "Return ONLY JSON: {\"segments\":[{\"chunk_id\":<int>,\"ai_probability\":<0-1 float>}]} "
-                "with no markdown, no code fences, no reasoning text."
-            )
-            model = info.get("model") or "glm-4.6"
-            tasks.append(
-                callGLMChat(
-                    model,
-                    glm_key,
-                    system_prompt,
-                    json.dumps(payload, ensure_ascii=False),
-                    max_tokens=4096,
-                    enable_reasoning=False,
-                    reasoning_effort="high",
-                )
-            )
-            models.append(model)
+    glm_key = glm_key or getGLMKey()
+    # local probabilities before fusion, index-aligned with segments
+    pre_local = [float(seg["aiProbability"]) for seg in segments]
+    tasks, models = _start_judgment_calls(segments, providers, glm_key, _JUDGMENT_SYSTEM_PROMPT_V2, "GLM API Key 缺失")
     if not tasks:
         return {"calls": 0, "success": 0, "latencyMs": 0}
-    results = await asyncio.gather(*tasks, return_exceptions=True)
     stats = {"calls": len(tasks), "success": 0, "latencyMs": 0}
     errors: List[str] = []
-    import statistics
-    for idx, result in enumerate(results):
-        model = models[idx] if idx < len(models) else "glm-4.6"
-        if isinstance(result, Exception) or not result:
-            errors.append(str(result))
-            continue
-        try:
-            stats["latencyMs"] += int(result.get("latency_ms", 0)) if isinstance(result, dict) else 0
-        except Exception:
-            pass
-        data = result.get("content") if isinstance(result, dict) else None
-        if not data:
-            errors.append("response_empty")
-            continue
-        parsed = None
-        if isinstance(data, str):
-            data_str = data.strip()
-            try:
-                parsed = json.loads(data_str)
-            except json.JSONDecodeError:
-                m = _LLM_SEGMENT_JSON_RE.search(data_str)
-                if m:
-                    try:
-                        parsed = json.loads(m.group(0))
-                    except Exception:
-                        parsed = None
-        else:
-            try:
-                parsed = json.loads(data)
-            except Exception:
-                parsed = None
-        if parsed is None and isinstance(result, dict) and result.get("reasoning"):
+    by_id = _segments_by_chunk_id(segments)
+    written: Dict[int, int] = {}
+    try:
+        # replies are parsed and applied as they arrive instead of after the slowest one
+        async for idx, result in _iter_completed(tasks):
+            model = models[idx] if idx < len(models) else "glm-4.6"
+            if isinstance(result, Exception) or not result:
+                errors.append(str(result))
+                continue
             try:
-                m = _LLM_SEGMENT_JSON_RE.search(str(result.get("reasoning", "")))
-                if m:
-                    parsed = json.loads(m.group(0))
+                stats["latencyMs"] += int(result.get("latency_ms", 0)) if isinstance(result, dict) else 0
             except Exception:
-                parsed = None
-        if parsed is None:
-            errors.append("parse_failed")
-            continue
-        updates = parsed.get("segments") if isinstance(parsed, dict) else parsed
-        if not isinstance(updates, list):
-            errors.append("response_missing_segments")
-            continue
-        try:
-            probs_tmp = [float(item.get("ai_probability", 0.5)) for item in updates if item is not None]
-            if len(probs_tmp) > 1:
-                var_tmp = statistics.pvariance(probs_tmp)
-                if var_tmp < 1e-4:
-                    errors.append("llm_probs_constant")
-                    continue
-        except Exception:
-            pass
-        stats["success"] += 1
-        for item in updates:
+                pass
+            data = result.get("content") if isinstance(result, dict) else None
+            if not data:
+                errors.append("response_empty")
+                continue
+            parsed = None
+            if isinstance(data, str):
+                data_str = data.strip()
+                try:
+                    parsed = _json_loads(data_str)
+                except ValueError:
+                    parsed = _extract_json_object(data_str)
+            else:
+                try:
+                    parsed = _json_loads(data)
+                except Exception:
+                    parsed = None
+            if parsed is None and isinstance(result, dict) and result.get("reasoning"):
+                parsed = _extract_json_object(str(result.get("reasoning", "")))
+            if parsed is None:
+                errors.append("parse_failed")
+                continue
+            updates = parsed.get("segments") if isinstance(parsed, dict) else parsed
+            if not isinstance(updates, list):
+                errors.append("response_missing_segments")
+                continue
             try:
-                chunk_id = int(item.get("chunk_id"))
-                prob = float(item.get("ai_probability", 0.5))
+                probs_tmp = [float(item.get("ai_probability", 0.5)) for item in updates if item is not None]
+                if len(probs_tmp) > 1:
+                    var_tmp = _pvariance(probs_tmp)
+                    if var_tmp < 1e-4:
+                        errors.append("llm_probs_constant")
+                        continue
             except Exception:
-                continue
-            for seg in segments:
-                if seg["chunkId"] == chunk_id:
-                    seg["signals"]["llmJudgment"] = {
-                        "prob": prob,
-                        "models": [model],
-                        "reasoning": result.get("reasoning") if isinstance(result, dict) else None,
-                    }
+                pass
+            stats["success"] += 1
+            _apply_llm_judgment(by_id, written, idx, updates, model, result)
+    finally:
+        await _cancel_pending(tasks)
     if stats["success"] == 0:
         # 全部失败时仍返回 stats，避免阻断流程
         try:
@@ -1641,26 +2112,24 @@ async def _run_llm_judgment_v2(segments: List[Dict[str, Any]], providers: Option
         stats['errors'] = errors
         return stats
     try:
-        llm_probs: List[float] = []
-        local_probs: List[float] = []
-        for seg in segments:
+        # (segment, llm prob, local prob) for every judged segment, reused by the fusion pass
+        judged = []
+        for seg, base in zip(segments, pre_local):
             lp = seg.get("signals", {}).get("llmJudgment", {}).get("prob")
             if lp is not None:
-                llm_probs.append(float(lp))
-                local_probs.append(float(pre_local.get(seg["chunkId"], seg.get("aiProbability", 0.5))))
+                judged.append((seg, float(lp), base))
+        llm_probs = [lp for _, lp, _ in judged]
+        local_probs = [base for _, _, base in judged]
         if llm_probs:
-            var_llm = statistics.pvariance(llm_probs) if len(llm_probs) > 1 else 0.0
-            var_local = statistics.pvariance(local_probs) if len(local_probs) > 1 else 0.0
+            var_llm = _pvariance(llm_probs)
+            var_local = _pvariance(local_probs)
             w = 0.30 + 0.25 * (var_llm / max(1e-9, (var_llm + var_local)))
             w = max(0.20, min(0.55, w))
-            for seg in segments:
-                lp = seg.get("signals", {}).get("llmJudgment", {}).get("prob")
-                if lp is None:
-                    continue
-                base = float(pre_local.get(seg["chunkId"], seg.get("aiProbability", 0.5)))
-                fused = base * (1.0 - w) + float(lp) * w
+            note = f"llmAdaptiveFusion(w={w:.2f})"
+            for seg, lp, base in judged:
+                fused = base * (1.0 - w) + lp * w
                 seg["aiProbability"] = max(0.02, min(0.98, fused))
-                seg.setdefault("explanations", []).append(f"llmAdaptiveFusion(w={w:.2f})")
+                seg.setdefault("explanations", []).append(note)
     except Exception:
         pass
     return stats
@@ -1668,6 +2137,16 @@ async def _run_llm_judgment_v2(segments: List[Dict[str, Any]], providers: Option
 # Detection entry points
 # ---------------------------------------------------------------------------
 
+def _prepare_detect_input(
+    text: str, chunkSizeTokens: int, overlapTokens: int, sensitivity: str
+) -> Tuple[str, List[Dict[str, Any]], int, int]:
+    normalized = preprocessText(text, True)
+    blocks = buildParagraphBlocksFromText(normalized)
+    detect_blocks = [b for b in blocks if b.get("needDetect", True)] or blocks
+    chunk_tokens, overlap_tokens = _resolve_profile(chunkSizeTokens, overlapTokens, sensitivity)
+    return normalized, detect_blocks, chunk_tokens, overlap_tokens
+
+
 async def detect_async(
     text: str,
     language: str,
@@ -1679,16 +2158,24 @@ async def detect_async(
     useStylometry: bool = True,
     sensitivity: str = "medium",
     enable_dual_detection: bool = True,
+    segment_plan: Any = _NOT_PLANNED,
+    prepared_input: Optional[_DetectInput] = None,
 ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any], Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Detect AI-generated text.
+
+    ``prepared_input`` is this request's entry from prepare_batch_inputs; when
+    given, the text is not normalized and blocked again.
+    """
     _clear_runtime_cache()
     started = time.time()
+    # resolved once per request and handed to the LLM helpers
+    glm_key = getGLMKey()
     provider_specs = list(providers or [])
-    if not provider_specs and getGLMKey():
+    if not provider_specs and glm_key:
         provider_specs = ["glm:glm-4.6"]
-    normalized = preprocessText(text, True)
-    blocks = buildParagraphBlocksFromText(normalized)
-    detect_blocks = [b for b in blocks if b.get("needDetect", True)] or blocks
-    chunk_tokens, overlap_tokens = _resolve_profile(chunkSizeTokens, overlapTokens, sensitivity)
+    normalized, detect_blocks, chunk_tokens, overlap_tokens = prepared_input or _prepare_detect_input(
+        text, chunkSizeTokens, overlapTokens, sensitivity
+    )
     try:
         logging.info(
             "segmentation_profile chunk=%s overlap=%s blocks=%s sensitivity=%s len=%s",
@@ -1700,54 +2187,73 @@ async def detect_async(
         )
     except Exception:
         pass
-    segments = await _build_segments_via_llm(
+    local_segments = partial(
+        buildSegmentsAligned,
         normalized,
         language or "zh-CN",
-        detect_blocks,
         chunk_tokens,
+        overlap_tokens,
+        detect_blocks,
         usePerplexity,
         useStylometry,
+        sensitivity,
     )
-    llm_segment_used = segments is not None
-    if segments:
-        segments = _split_segments_by_length(
-            segments,
-            normalized,
-            language or "zh-CN",
-            chunk_tokens,
-            usePerplexity,
-            useStylometry,
-        )
-    if not segments:
-        segments = buildSegmentsAligned(
-            normalized,
-            language or "zh-CN",
-            chunk_tokens,
-            overlap_tokens,
-            detect_blocks,
-            usePerplexity,
-            useStylometry,
-            sensitivity,
-        )
-
-    # [VAR-SPREAD-FLAT-CHECK] 当 LLM 分段过少或过于平坦时，尝试更高敏感度切分
+    fallback: Optional["asyncio.Future[List[Dict[str, Any]]]"] = None
     try:
-        std0 = _std([s["aiProbability"] for s in segments])
-        if llm_segment_used and (len(segments) < 6 or std0 < 0.06) and sensitivity != "high":
-            alt = buildSegmentsAligned(
+        if segment_plan is _NOT_PLANNED:
+            llm_plan = _build_segments_via_llm(
                 normalized,
                 language or "zh-CN",
-                max(180, chunk_tokens // 2),
-                max(0, overlap_tokens // 2),
                 detect_blocks,
+                chunk_tokens,
                 usePerplexity,
                 useStylometry,
-                "high",
+                api_key=glm_key,
             )
-            std1 = _std([s["aiProbability"] for s in alt])
-            if std1 >= max(std0 * 1.2, 0.06):
-                segments = alt
-                logging.info("segmentation_flat->resplit std0=%.4f std1=%.4f", std0, std1)
+            if glm_key:
+                # the local fallback runs on a worker thread while the planner is waiting; it is
+                # only awaited, and its errors only surface, when the plan comes back empty
+                fallback = asyncio.ensure_future(asyncio.to_thread(local_segments))
+                fallback.add_done_callback(lambda f: f.cancelled() or f.exception())
+            segments = await llm_plan
+        else:
+            segments = segment_plan
+        llm_segment_used = segments is not None
+        if segments:
+            segments = _split_segments_by_length(
+                segments,
+                normalized,
+                language or "zh-CN",
+                chunk_tokens,
+                usePerplexity,
+                useStylometry,
+            )
+        if not segments:
+            segments = await fallback if fallback is not None else local_segments()
+    finally:
+        if fallback is not None and not fallback.done():
+            fallback.cancel()
+
+    # [VAR-SPREAD-FLAT-CHECK] 当 LLM 分段过少或过于平坦时，尝试更高敏感度切分
+    try:
+        # only an LLM plan outside "high" sensitivity can be re-split, so only then is the spread needed
+        if llm_segment_used and sensitivity != "high":
+            std0 = _pstdev([s["aiProbability"] for s in segments])
+            if len(segments) < 6 or std0 < 0.06:
+                alt = buildSegmentsAligned(
+                    normalized,
+                    language or "zh-CN",
+                    max(180, chunk_tokens // 2),
+                    max(0, overlap_tokens // 2),
+                    detect_blocks,
+                    usePerplexity,
+                    useStylometry,
+                    "high",
+                )
+                std1 = _pstdev([s["aiProbability"] for s in alt])
+                if std1 >= max(std0 * 1.2, 0.06):
+                    segments = alt
+                    logging.info("segmentation_flat->resplit std0=%.4f std1=%.4f", std0, std1)
     except Exception:
         pass
     try:
@@ -1760,7 +2266,7 @@ async def detect_async(
         pass
     llm_stats = None
     if provider_specs:
-        llm_stats = await _run_llm_judgment_v2(segments, provider_specs)
+        llm_stats = await _run_llm_judgment_v2(segments, provider_specs, glm_key)
     _contrast_sharpen_segments(segments, sensitivity)
     agg = aggregateSegments(segments)
     agg["decision"] = deriveDecision(agg["overallProbability"], agg["thresholds"], DEFAULT_BUFFER_MARGIN)
@@ -1769,7 +2275,8 @@ async def detect_async(
         "tokens": estimateTokens(normalized),
         "latencyMs": int((time.time() - started) * 1000),
         "providerBreakdown": {
-            "glmRequested": len([p for p in provider_specs if p.startswith("glm")]),
+            # calls actually made: repeated GLM models share one request
+            "glmRequested": (llm_stats or {}).get("calls", 0),
             "glmSuccess": (llm_stats or {}).get("success", 0) if llm_stats else 0,
         },
         "segmentationSource": "llm" if llm_segment_used else "local",
@@ -1852,7 +2359,15 @@ def detect(*args, **kwargs):  # pragma: no cover
         loop = None
     if loop and loop.is_running():  # pragma: no cover
         raise RuntimeError("detect() cannot be called inside running event loop")
-    return asyncio.run(detect_async(*args, **kwargs))
+
+    async def run():
+        try:
+            return await detect_async(*args, **kwargs)
+        finally:
+            # asyncio.run closes this loop, so its pooled GLM client has to go first
+            await closeGLMClient()
+
+    return asyncio.run(run())
 
 
 __all__ = [
@@ -1866,6 +2381,9 @@ __all__ = [
     "computeStylometryMetrics",
     "detect",
     "detect_async",
+    "build_llm_segments_batch",
+    "start_llm_segments_batch",
+    "prepare_batch_inputs",
     "aggregateSegments",
     "DEFAULT_BUFFER_MARGIN",
     "deriveDecision",
@@ -1874,6 +2392,7 @@ __all__ = [
     "paper_analyze",
     "setCalibration",
     "applyCalibration",
+    "applyCalibrationMany",
     "_rubric_version",
     "_rubric_changelog",
     "_calibration",
@@ -2,12 +2,17 @@
 """Shared utilities for building API responses."""
 
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from ..schemas import (
     DetectResponse,
     AggregationResponse,
     SegmentResponse,
+    SegmentOffsets,
+    SegmentSignals,
+    SignalLLMJudgment,
+    SignalPerplexity,
+    SignalStylometry,
     PreprocessSummary,
     CostBreakdown,
     AggregationThresholds,
@@ -17,41 +22,115 @@ from ..schemas import (
     ComparisonResult,
     DivergentRegion,
 )
-from ..service import DEFAULT_BUFFER_MARGIN
+from ..service import DEFAULT_BUFFER_MARGIN, applyCalibrationMany, deriveDecision
 from ..core.config import API_VERSION
 
 
+def apply_calibration(agg: Dict[str, Any], segments: List[Dict[str, Any]]) -> None:
+    """Calibrate the overall and per-segment probabilities in place and re-derive the decision."""
+    probs = applyCalibrationMany([s["aiProbability"] for s in segments] + [agg["overallProbability"]])
+    for s, p in zip(segments, probs):
+        s["aiProbability"] = p
+    agg["overallProbability"] = probs[-1]
+    agg["decision"] = deriveDecision(
+        agg["overallProbability"],
+        agg["thresholds"],
+        float(agg.get("bufferMargin", DEFAULT_BUFFER_MARGIN))
+    )
+
+
+# The builders below use model_construct, which skips validation: their inputs
+# come from aggregateSegments / _make_segment, never from the client. Float
+# fields are still passed through float() so the JSON matches what validation
+# would have produced.
+
+
+def _opt_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
 def build_aggregation_response(agg: Dict[str, Any]) -> AggregationResponse:
     """Build AggregationResponse from aggregation dict."""
-    return AggregationResponse(
-        overallProbability=agg["overallProbability"],
-        overallConfidence=agg["overallConfidence"],
+    thresholds = agg["thresholds"]
+    # aggregateSegments gives every result its own copies of these dicts, so they are used as-is
+    block_weights = agg.get("blockWeights", {})
+    dimension_scores = agg.get("dimensionScores", {})
+    return AggregationResponse.model_construct(
+        overallProbability=float(agg["overallProbability"]),
+        overallConfidence=float(agg["overallConfidence"]),
         method=agg["method"],
-        thresholds=AggregationThresholds(**agg["thresholds"]),
+        thresholds=AggregationThresholds.model_construct(
+            low=float(thresholds["low"]),
+            medium=float(thresholds["medium"]),
+            high=float(thresholds["high"]),
+            veryHigh=float(thresholds["veryHigh"]),
+        ),
         rubricVersion=agg["rubricVersion"],
         decision=agg["decision"],
         bufferMargin=float(agg.get("bufferMargin", DEFAULT_BUFFER_MARGIN)),
         stylometryProbability=float(agg.get("stylometryProbability", agg["overallProbability"])),
         qualityScoreNormalized=float(agg.get("qualityScoreNormalized", 0.0)),
-        blockWeights=dict(agg.get("blockWeights", {})) if isinstance(agg.get("blockWeights", {}), dict) else None,
-        dimensionScores=dict(agg.get("dimensionScores", {})) if isinstance(agg.get("dimensionScores", {}), dict) else None,
+        blockWeights=block_weights if isinstance(block_weights, dict) else None,
+        dimensionScores=dimension_scores if isinstance(dimension_scores, dict) else None,
+    )
+
+
+def _segment_response(s: Dict[str, Any]) -> SegmentResponse:
+    signals = s["signals"]
+    llm = signals["llmJudgment"]
+    ppl = signals["perplexity"]
+    sty = signals["stylometry"]
+    return SegmentResponse.model_construct(
+        chunkId=s["chunkId"],
+        language=s["language"],
+        offsets=SegmentOffsets.model_construct(start=s["offsets"]["start"], end=s["offsets"]["end"]),
+        aiProbability=float(s["aiProbability"]),
+        confidence=float(s["confidence"]),
+        signals=SegmentSignals.model_construct(
+            # the judgment dict may carry extra keys (e.g. "reasoning") that the schema drops
+            llmJudgment=SignalLLMJudgment.model_construct(
+                prob=_opt_float(llm.get("prob")),
+                models=list(llm.get("models") or []),
+            ),
+            perplexity=SignalPerplexity.model_construct(ppl=_opt_float(ppl.get("ppl")), z=_opt_float(ppl.get("z"))),
+            stylometry=SignalStylometry.model_construct(
+                ttr=float(sty["ttr"]),
+                avgSentenceLen=float(sty["avgSentenceLen"]),
+                functionWordRatio=_opt_float(sty.get("functionWordRatio")),
+                repeatRatio=_opt_float(sty.get("repeatRatio")),
+                punctuationRatio=_opt_float(sty.get("punctuationRatio")),
+            ),
+        ),
+        explanations=list(s["explanations"]),
     )
 
 
 def build_segments_response(segments: List[Dict[str, Any]]) -> List[SegmentResponse]:
     """Build list of SegmentResponse from segments list."""
-    return [
-        SegmentResponse(
-            chunkId=s["chunkId"],
-            language=s["language"],
-            offsets=s["offsets"],
-            aiProbability=s["aiProbability"],
-            confidence=s["confidence"],
-            signals=s["signals"],
-            explanations=s["explanations"],
-        )
-        for s in segments
-    ]
+    return [_segment_response(s) for s in segments]
+
+
+def _mode_result(mode: Dict[str, Any]) -> ModeDetectionResult:
+    return ModeDetectionResult.model_construct(
+        aggregation=build_aggregation_response(mode["aggregation"]),
+        segments=build_segments_response(mode["segments"]),
+        segmentCount=int(mode["segmentCount"]),
+    )
+
+
+def _dual_detection_result(dual_detection: Dict[str, Any]) -> DualDetectionResult:
+    """Paragraph/sentence results plus their comparison; the comparison is small and stays validated."""
+    comparison_data = dual_detection["comparison"]
+    comparison_result = ComparisonResult(
+        probabilityDiff=comparison_data["probabilityDiff"],
+        consistencyScore=comparison_data["consistencyScore"],
+        divergentRegions=[DivergentRegion(**region) for region in comparison_data.get("divergentRegions", [])],
+    )
+    return DualDetectionResult.model_construct(
+        paragraph=_mode_result(dual_detection["paragraph"]),
+        sentence=_mode_result(dual_detection["sentence"]),
+        comparison=comparison_result,
+    )
 
 
 def build_detect_response(
@@ -62,46 +141,14 @@ def build_detect_response(
     dual_detection: Dict[str, Any] = None,
 ) -> DetectResponse:
     """Build complete DetectResponse."""
-    dual_detection_result = None
-    if dual_detection:
-        # Build dual detection result
-        para_result = ModeDetectionResult(
-            aggregation=build_aggregation_response(dual_detection["paragraph"]["aggregation"]),
-            segments=build_segments_response(dual_detection["paragraph"]["segments"]),
-            segmentCount=dual_detection["paragraph"]["segmentCount"]
-        )
-        
-        sent_result = ModeDetectionResult(
-            aggregation=build_aggregation_response(dual_detection["sentence"]["aggregation"]),
-            segments=build_segments_response(dual_detection["sentence"]["segments"]),
-            segmentCount=dual_detection["sentence"]["segmentCount"]
-        )
-        
-        comparison_data = dual_detection["comparison"]
-        divergent_regions = [
-            DivergentRegion(**region) for region in comparison_data.get("divergentRegions", [])
-        ]
-        
-        comparison_result = ComparisonResult(
-            probabilityDiff=comparison_data["probabilityDiff"],
-            consistencyScore=comparison_data["consistencyScore"],
-            divergentRegions=divergent_regions
-        )
-        
-        dual_detection_result = DualDetectionResult(
-            paragraph=para_result,
-            sentence=sent_result,
-            comparison=comparison_result
-        )
-    
-    return DetectResponse(
+    return DetectResponse.model_construct(
         aggregation=build_aggregation_response(agg),
         segments=build_segments_response(segments),
         preprocessSummary=PreprocessSummary(**pre_summary),
         cost=CostBreakdown(**cost),
         version=API_VERSION,
         requestId=str(uuid.uuid4()),
-        dualDetection=dual_detection_result,
+        dualDetection=_dual_detection_result(dual_detection) if dual_detection else None,
     )
 
 
@@ -113,7 +160,7 @@ def build_batch_item_response(
     cost: Dict[str, Any],
 ) -> BatchItemResponse:
     """Build BatchItemResponse for batch detection."""
-    return BatchItemResponse(
+    return BatchItemResponse.model_construct(
         id=item_id,
         aggregation=build_aggregation_response(agg),
         segments=build_segments_response(segments),
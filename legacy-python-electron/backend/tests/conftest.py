@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures for the backend tests."""
+
+import pytest
+
+import backend.app.config_store as config_store
+
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    """Root the config store in a temp dir with an empty in-memory cache.
+
+    Background checkpoints are pushed out so tests decide when the WAL is folded.
+    """
+    monkeypatch.setenv("CHEEKAI_CONFIG_DIR", str(tmp_path))
+    monkeypatch.setattr(config_store, "CHECKPOINT_DELAY", 60.0)
+    monkeypatch.setattr(config_store, "CHECKPOINT_MAX_DELAY", 60.0)
+    config_store._reset_for_tests()
+    yield tmp_path
+    config_store.store.checkpoint()
+    config_store._reset_for_tests()
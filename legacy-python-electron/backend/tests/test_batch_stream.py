@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Tests for the NDJSON streaming mode of /api/detect/batch."""
+
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import backend.app.routers.detect as detect_routes
+from backend.app.main import api
+from backend.app.schemas import (
+    AggregationResponse,
+    AggregationThresholds,
+    BatchDetectRequest,
+    BatchItemResponse,
+    CostBreakdown,
+    PreprocessSummary,
+)
+
+# item id -> (delay in seconds, overall probability); None marks an item that fails
+_ITEMS = {"slow": (0.2, 0.8), "bad": None, "fast": (0.0, 0.4)}
+
+
+def _item_response(item_id, prob):
+    return BatchItemResponse(
+        id=item_id,
+        aggregation=AggregationResponse(
+            overallProbability=prob,
+            overallConfidence=0.5,
+            method="test",
+            thresholds=AggregationThresholds(),
+            rubricVersion="test",
+            decision="review",
+            bufferMargin=0.0,
+        ),
+        segments=[],
+        preprocessSummary=PreprocessSummary(language="zh-CN", chunks=0),
+        cost=CostBreakdown(tokens=0, latencyMs=0),
+        version="test",
+    )
+
+
+async def _no_plans(items, parallel):
+    loop = asyncio.get_running_loop()
+    plans = [loop.create_future() for _ in items]
+    for p in plans:
+        p.set_result(None)
+    return [None] * len(items), plans
+
+
+async def _fake_item(it, plan, prepared_input=None):
+    spec = _ITEMS[it.id]
+    if spec is None:
+        raise RuntimeError("detect failed")
+    delay, prob = spec
+    await asyncio.sleep(delay)
+    return _item_response(it.id, prob)
+
+
+def test_stream_yields_items_in_completion_order_then_summary(monkeypatch):
+    """Finished items stream out as they complete; failures only show in the summary line."""
+    monkeypatch.setattr(detect_routes, "_plan_batch_segments", _no_plans)
+    monkeypatch.setattr(detect_routes, "_run_batch_item", _fake_item)
+    body = {"items": [{"id": k, "text": k} for k in _ITEMS], "parallel": 3}
+    resp = TestClient(api).post("/api/detect/batch", json=body, headers={"Accept": "application/x-ndjson"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["id"] for line in lines[:-1]] == ["fast", "slow"]
+    summary = lines[-1]["summary"]
+    assert (summary["count"], summary["failCount"]) == (3, 1)
+    assert abs(summary["avgProbability"] - 0.6) < 1e-9
+
+
+def test_closing_the_stream_cancels_unfinished_items(monkeypatch):
+    """A client that stops reading cancels the items still running."""
+    cancelled = []
+
+    async def blocking_item(it, plan, prepared_input=None):
+        if it.id == "fast":
+            return _item_response(it.id, 0.4)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(it.id)
+            raise
+
+    monkeypatch.setattr(detect_routes, "_plan_batch_segments", _no_plans)
+    monkeypatch.setattr(detect_routes, "_run_batch_item", blocking_item)
+    req = BatchDetectRequest(items=[{"id": k, "text": k} for k in ("slow", "fast", "bad")], parallel=3)
+
+    async def run():
+        results = detect_routes._iter_batch_results(req.items, req.parallel)
+        idx, first = await results.__anext__()
+        await results.aclose()
+        return first.id, [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    first_id, leftover = asyncio.run(run())
+    assert first_id == "fast"
+    assert sorted(cancelled) == ["bad", "slow"]
+    assert leftover == []
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""Tests for Platt-style calibration of detection probabilities."""
+
+import copy
+
+import pytest
+
+import backend.app.service as service
+
+
+@pytest.fixture(autouse=True)
+def restore_calibration(monkeypatch):
+    monkeypatch.setattr(service, "_calibration", copy.deepcopy(service._calibration))
+
+
+def test_calibration_follows_the_exported_dict():
+    """Edits to _calibration, including switching "current", apply on the next call."""
+    assert service.applyCalibrationMany([0.7]) == pytest.approx([0.7])
+    service._calibration["byVersion"]["alt"] = {"A": 2.0, "B": 0.0}
+    service._calibration["current"] = "alt"
+    assert service.applyCalibrationMany([0.7]) == pytest.approx([0.49 / 0.58])
+    service._calibration["current"] = service._rubric_version
+    service.setCalibration([{"prob": 0.9, "label": 1}, {"prob": 0.1, "label": 0}])
+    a = service._calibration["byVersion"][service._rubric_version]["A"]
+    assert a == 3.0
+    assert service.applyCalibration(0.5) == pytest.approx(0.5)
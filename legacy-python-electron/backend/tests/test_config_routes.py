@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Tests for the raw-body handling of the /api/config/file routes."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.app.config_store as config_store
+from backend.app.main import api
+
+
+@pytest.fixture
+def client(config_dir):
+    """Client whose config store is rooted in a temp dir with an empty in-memory cache."""
+    return TestClient(api)
+
+
+def test_put_replaces_data(client):
+    resp = client.put("/api/config/file", json={"data": {"a": 1}})
+    assert resp.status_code == 200
+    assert client.get("/api/config/file").json()["data"] == {"a": 1}
+
+
+@pytest.mark.parametrize(
+    "method, url",
+    [
+        ("put", "/api/config/file"),
+        ("patch", "/api/config/file/a.b"),
+        ("post", "/api/config/file/rollback"),
+    ],
+)
+@pytest.mark.parametrize("body, error_type", [(b"{not json", "json_invalid"), (b"[1, 2]", "dict_type")])
+def test_malformed_or_non_object_body_is_a_validation_error(client, method, url, body, error_type):
+    """Bodies that are not a JSON object get FastAPI's 422 validation response."""
+    resp = client.request(method, url, content=body, headers={"Content-Type": "application/json"})
+    assert resp.status_code == 422
+    detail = resp.json()["detail"]
+    assert detail[0]["type"] == error_type
+    assert detail[0]["loc"][0] == "body"
+
+
+def test_shutdown_flushes_pending_writes(client, tmp_path):
+    """Leaving the app's lifespan checkpoints writes still sitting in the WAL."""
+    with client:
+        assert client.patch("/api/config/file/a", json={"value": 1}).status_code == 200
+        assert (tmp_path / "api_config.wal").read_text(encoding="utf-8") != ""
+    assert (tmp_path / "api_config.wal").read_text(encoding="utf-8") == ""
+    assert config_store._read_file(str(tmp_path / "api_config.json"))["data"] == {"a": 1}
+
+
+def test_config_bodies_are_documented(client):
+    """PUT and PATCH document the JSON body they parse themselves."""
+    paths = client.get("/openapi.json").json()["paths"]
+    put = paths["/api/config/file"]["put"]["requestBody"]["content"]["application/json"]["schema"]
+    patch = paths["/api/config/file/{path}"]["patch"]["requestBody"]["content"]["application/json"]["schema"]
+    assert put["type"] == "object"
+    assert patch["required"] == ["value"]
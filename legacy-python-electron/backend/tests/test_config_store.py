@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Tests for ConfigStore caching and write-ahead log behaviour."""
+
+import json
+import os
+import time
+
+import pytest
+
+import backend.app.config_store as config_store
+from backend.app.config_store import ConfigStore
+
+
+@pytest.fixture
+def store(config_dir):
+    """Fresh store rooted in a temp dir with an empty in-memory cache."""
+    return ConfigStore()
+
+
+def _read_main(tmp_path):
+    with open(tmp_path / "api_config.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_set_get_delete_roundtrip(store):
+    """Dotted keys create nested dicts and can be removed again."""
+    store.set("a.b", 1)
+    store.set("a.c", [1, 2])
+    assert store.get("a") == {"b": 1, "c": [1, 2]}
+    assert store.delete("a.b") is True
+    assert store.delete("a.b") is False
+    assert store.get("a.b") is None
+
+
+def test_append_extends_list_without_touching_readers(store):
+    """append() publishes a new list; a list already handed out stays as it was."""
+    store.append("log", 1)
+    before = store.get("log")
+    store.append("log", 2)
+    assert before == [1]
+    assert store.get("log") == [1, 2]
+    # a fresh process replays the append records from the WAL
+    config_store._reset_for_tests()
+    assert ConfigStore().get("log") == [1, 2]
+
+
+def test_returned_values_do_not_alias_cache(store):
+    """Mutating what load() returns must not leak into the store; get() shares its value."""
+    store.set("items", [1])
+    assert store.get("items") is store.get("items")
+    store.load()["data"]["items"].append(2)
+    assert store.get("items") == [1]
+    cfg = store.load(shared=True)
+    cfg["data"] = {"items": [3]}
+    cfg["version"] = "x"
+    assert store.get("items") == [1]
+    assert store.load()["version"] != "x"
+
+
+def test_set_is_logged_to_wal_until_checkpoint(store, tmp_path):
+    """set() appends a WAL record; checkpoint() folds it into api_config.json."""
+    store.set("glm.apiKey", "k")
+    wal = (tmp_path / "api_config.wal").read_text(encoding="utf-8").splitlines()
+    assert json.loads(wal[-1])["op"] == "set"
+    assert _read_main(tmp_path)["data"] == {}
+
+    assert store.checkpoint() is True
+    assert _read_main(tmp_path)["data"] == {"glm": {"apiKey": "k"}}
+    assert (tmp_path / "api_config.wal").read_text(encoding="utf-8") == ""
+
+
+def test_wal_is_replayed_after_restart(store, tmp_path):
+    """A fresh process rebuilds pending mutations from the WAL."""
+    store.set("a", 1)
+    store.set("b.c", 2)
+    store.delete("a")
+    config_store._snapshot = (None, None)
+    assert ConfigStore().get("") == {"b": {"c": 2}}
+
+
+def test_external_edit_invalidates_cache(store, tmp_path):
+    """A changed mtime/size on disk forces a re-read."""
+    store.load()
+    with open(tmp_path / "api_config.json", "w", encoding="utf-8") as f:
+        json.dump({"version": "ext", "updatedAt": "", "data": {"external": True}}, f)
+    assert store.get("external") is True
+
+
+def test_versions_and_rollback(store, monkeypatch):
+    """save() snapshots a version that rollback() can restore."""
+    monkeypatch.setattr(config_store, "_timestamp", lambda: "20240101000001")
+    cfg = store.load()
+    cfg["data"] = {"k": 1}
+    store.save(cfg)
+    store.flush()
+    versions = store.versions()
+    assert versions
+    monkeypatch.setattr(config_store, "_timestamp", lambda: "20240101000002")
+    store.set("k", 2)
+    assert store.rollback(versions[0]) is True
+    assert store.get("k") == 1
+    assert store.rollback("missing") is False
+
+
+def test_versions_listing_is_rotated(store, tmp_path, monkeypatch):
+    """Only MAX_VERSIONS snapshots are listed and kept on disk."""
+    monkeypatch.setattr(config_store, "MAX_VERSIONS", 3)
+    for i in range(5):
+        (tmp_path / "versions").mkdir(exist_ok=True)
+        (tmp_path / "versions" / f"2024010100000{i}.json").write_text("{}", encoding="utf-8")
+    cfg = store.load()
+    store.save(cfg)
+    versions = store.versions()
+    assert len(versions) == 3
+    assert versions == sorted(versions, reverse=True)
+    store.flush()
+    assert store.versions() == versions
+    assert sorted(p.stem for p in (tmp_path / "versions").glob("*.json")) == sorted(versions)
+
+
+def test_versions_listing_does_not_checkpoint(store, tmp_path):
+    """Pending writes are listed under their version without writing the file."""
+    store.set("k", 1)
+    version = store.load()["version"]
+    assert store.versions()[0] == version
+    assert _read_main(tmp_path)["data"] == {}
+    assert not (tmp_path / "versions" / f"{version}.json").exists()
+    # rolling back to the pending version does not depend on who listed versions last
+    store.versions()
+    assert store.rollback(version) is True
+    assert store.get("k") == 1
+
+
+def test_rollback_checkpoints_before_reading_a_version(store, monkeypatch):
+    """A version that is not the published one is read from its file after a flush."""
+    monkeypatch.setattr(config_store, "_timestamp", lambda: "20240101000001")
+    store.set("k", 1)
+    monkeypatch.setattr(config_store, "_timestamp", lambda: "20240101000002")
+    store.set("k", 2)
+    # both writes fold into one checkpoint, so the superseded version never gets a file
+    assert store.rollback("20240101000001") is False
+    assert store.rollback("20240101000002") is True
+    assert store.get("k") == 2
+
+
+def test_version_snapshot_survives_next_save(store, tmp_path, monkeypatch):
+    """The version written by save() keeps its contents after later saves."""
+    stamps = iter(["20240101000001", "20240101000002"])
+    monkeypatch.setattr(config_store, "_timestamp", lambda: next(stamps))
+    cfg = store.load()
+    cfg["data"] = {"k": 1}
+    store.save(cfg)
+    store.flush()
+    ver = tmp_path / "versions" / "20240101000001.json"
+    if hasattr(os, "link"):
+        assert os.path.samefile(ver, tmp_path / "api_config.json")
+    cfg["data"] = {"k": 2}
+    store.save(cfg)
+    store.flush()
+    with open(ver, encoding="utf-8") as f:
+        assert json.load(f)["data"] == {"k": 1}
+
+
+def test_get_memo_tracks_snapshot(store):
+    """Repeated get() calls see writes made in between."""
+    store.set("p.q", 1)
+    assert store.get("p.q") == 1
+    assert store.get("p.q") == 1
+    store.set("p.q", 2)
+    assert store.get("p.q") == 2
+    store.delete("p.q")
+    assert store.get("p.q") is None
+
+
+def test_save_is_logged_and_written_by_checkpoint(store, tmp_path):
+    """save() publishes immediately and survives a restart before the file write."""
+    cfg = store.load()
+    cfg["data"] = {"saved": True}
+    store.save(cfg)
+    assert store.get("saved") is True
+    assert _read_main(tmp_path)["data"] == {}
+    config_store._snapshot = (None, None)
+    assert ConfigStore().get("saved") is True
+    assert store.flush() is True
+    assert _read_main(tmp_path)["data"] == {"saved": True}
+
+
+def test_save_reports_new_version_before_checkpoint(store, monkeypatch):
+    """load() shows the version a mutation stamped, before and after the file write."""
+    stamps = iter(["20240101000001", "20240101000002"])
+    monkeypatch.setattr(config_store, "_timestamp", lambda: next(stamps))
+    cfg = store.load()
+    cfg["data"] = {"k": 1}
+    store.save(cfg)
+    assert store.load()["version"] == "20240101000001"
+    store.set("k", 2)
+    assert store.load()["version"] == "20240101000002"
+    config_store._snapshot = (None, None)
+    assert store.load()["version"] == "20240101000002"
+    store.flush()
+    assert store.load()["version"] == "20240101000002"
+    assert store.versions()[0] == "20240101000002"
+
+
+def test_burst_of_writes_is_checkpointed_after_debounce(store, tmp_path, monkeypatch):
+    """A burst of mutations is folded into the file once writes go quiet."""
+    monkeypatch.setattr(config_store, "CHECKPOINT_DELAY", 0.05)
+    monkeypatch.setattr(config_store, "CHECKPOINT_MAX_DELAY", 0.25)
+    for i in range(10):
+        store.set("n", i)
+    wal = tmp_path / "api_config.wal"
+    # the checkpoint replaces the main file before it truncates the WAL, so wait for both
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if _read_main(tmp_path)["data"] == {"n": 9} and wal.read_text(encoding="utf-8") == "":
+            break
+        time.sleep(0.01)
+    assert _read_main(tmp_path)["data"] == {"n": 9}
+    assert wal.read_text(encoding="utf-8") == ""
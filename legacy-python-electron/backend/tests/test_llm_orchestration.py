@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Tests for the GLM judgment fan-out in the detection service."""
+
+import asyncio
+import weakref
+
+import pytest
+
+import backend.app.providers as providers
+import backend.app.service as service
+
+
+def _segments(n=2):
+    return [
+        {
+            "chunkId": i,
+            "aiProbability": 0.5,
+            "signals": {"stylometry": {"ttr": 0.5, "avgSentenceLen": 20.0, "repeatRatio": 0.1}},
+        }
+        for i in range(n)
+    ]
+
+
+def test_cancelled_judgment_cancels_inflight_calls(monkeypatch):
+    """Cancelling the runner must not leave GLM calls running in the background."""
+    started, cancelled = [], []
+
+    async def fake_call(model, *args, **kwargs):
+        started.append(model)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+
+    monkeypatch.setattr(service, "callGLMChat", fake_call)
+
+    async def run():
+        task = asyncio.create_task(
+            service._run_llm_judgment_v2(_segments(), ["glm:glm-a", "glm:glm-b"], "key")
+        )
+        while len(started) < 2:
+            await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    leftover = asyncio.run(run())
+    assert sorted(cancelled) == ["glm-a", "glm-b"]
+    assert leftover == []
+
+
+def test_glm_clients_of_closed_loops_are_dropped(monkeypatch):
+    """A loop left without closeGLMClient() does not keep its pooled client registered."""
+    monkeypatch.setattr(providers, "_GLM_CLIENTS", weakref.WeakKeyDictionary())
+
+    async def open_client():
+        providers._get_glm_client()
+        return len(providers._GLM_CLIENTS)
+
+    assert asyncio.run(open_client()) == 1
+    assert asyncio.run(open_client()) == 1
+
+    async def open_and_close():
+        providers._get_glm_client()
+        await providers.closeGLMClient()
+
+    asyncio.run(open_and_close())
+    assert len(providers._GLM_CLIENTS) == 0
+
+
+def _member(i, n_blocks=2, chars=40):
+    blocks = [{"text": "字" * chars, "label": "body"} for _ in range(n_blocks)]
+    return (i, f"doc{i}", "zh-CN", blocks, service._llm_block_lines(blocks))
+
+
+def test_pack_llm_groups_respects_doc_limit(monkeypatch):
+    """No prompt carries more than LLM_SEGMENT_BATCH_MAX_DOCS documents."""
+    monkeypatch.setattr(service, "LLM_SEGMENT_BATCH_MAX_DOCS", 2)
+    packs = service._pack_llm_groups([_member(i) for i in range(5)])
+    assert [[m[0] for m in p] for p in packs] == [[0, 1], [2, 3], [4]]
+
+
+def test_pack_llm_groups_respects_token_limit(monkeypatch):
+    """A document whose listing would overflow the token budget starts a new prompt."""
+    members = [_member(i) for i in range(3)]
+    per_doc = sum(service.estimateTokens(line) for line in members[0][4])
+    monkeypatch.setattr(service, "LLM_SEGMENT_BATCH_MAX_DOCS", 10)
+    monkeypatch.setattr(service, "LLM_SEGMENT_BATCH_MAX_TOKENS", 2 * per_doc)
+    packs = service._pack_llm_groups(members)
+    assert [[m[0] for m in p] for p in packs] == [[0, 1], [2]]
+    # a single oversized document still gets a prompt of its own
+    monkeypatch.setattr(service, "LLM_SEGMENT_BATCH_MAX_TOKENS", 1)
+    assert [len(p) for p in service._pack_llm_groups(members)] == [1, 1, 1]
+
+
+def _run_group(monkeypatch, content):
+    """Plan three docs through one batch call answering ``content``; returns (results, retried texts)."""
+    retried = []
+
+    async def fake_call(*args, **kwargs):
+        return {"content": content}
+
+    async def fake_single(text, *args, **kwargs):
+        retried.append(text)
+        return [{"planned": "single", "text": text}]
+
+    monkeypatch.setattr(service, "getGLMKey", lambda: "key")
+    monkeypatch.setattr(service, "callGLMChat", fake_call)
+    monkeypatch.setattr(service, "_build_segments_via_llm", fake_single)
+    monkeypatch.setattr(
+        service,
+        "_resolve_llm_plan",
+        lambda segs, text, *args: [{"planned": "batch", "text": text}] if segs else None,
+    )
+    docs = [m[1:] for m in (_member(i) for i in range(3))]
+    results = asyncio.run(
+        service._build_segments_via_llm_group(docs, 400, True, True, asyncio.Semaphore(2))
+    )
+    return results, retried
+
+
+def test_group_plan_falls_back_per_document_when_reply_is_malformed(monkeypatch):
+    """A batch reply that is not JSON sends every document to its own call."""
+    results, retried = _run_group(monkeypatch, "not json at all")
+    assert retried == ["doc0", "doc1", "doc2"]
+    assert [r[0]["planned"] for r in results] == ["single"] * 3
+
+
+def test_group_plan_retries_only_missing_documents(monkeypatch):
+    """Documents the batch reply leaves out or plans invalidly are retried on their own."""
+    reply = '{"docs":[{"doc_id":0,"segments":[{"chunk_id":0}]},{"doc_id":2,"segments":[]}]}'
+    results, retried = _run_group(monkeypatch, reply)
+    assert retried == ["doc1", "doc2"]
+    assert [r[0]["planned"] for r in results] == ["batch", "single", "single"]
+
+
+def test_cancelling_batch_plans_stops_their_call(monkeypatch):
+    """Cancelling every plan future of a group cancels the GLM call planning it."""
+    started, cancelled = [], []
+
+    async def fake_call(*args, **kwargs):
+        started.append(1)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    monkeypatch.setattr(service, "getGLMKey", lambda: "key")
+    monkeypatch.setattr(service, "callGLMChat", fake_call)
+    monkeypatch.setattr(
+        service,
+        "_prepare_detect_input",
+        lambda text, *args: (text, [{"text": text + "a", "label": "body"}, {"text": text + "b", "label": "body"}], 400, 0),
+    )
+
+    async def run():
+        plans = service.start_llm_segments_batch([{"text": "x"}, {"text": "y"}], parallel=2)
+        while not started:
+            await asyncio.sleep(0)
+        for p in plans:
+            p.cancel()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    leftover = asyncio.run(run())
+    assert started == [1]
+    assert cancelled == [1]
+    assert leftover == []
+
+
+_DETECT_TEXT = "\n\n".join(f"这是第{i}段测试文本，用来检查分段规划与本地回退的行为。" * 3 for i in range(4))
+
+
+def _detect_with_failing_fallback(monkeypatch, plan_ok):
+    """Run detect_async with a GLM key, a planner that succeeds or not, and a local builder that raises."""
+    local = service.buildSegmentsAligned
+
+    async def fake_plan(text, language, blocks, chunk_tokens, ppl, style, api_key=None):
+        return local(text, language, chunk_tokens, 0, blocks, ppl, style, "high") if plan_ok else None
+
+    def failing_local(*args, **kwargs):
+        raise RuntimeError("local segmentation failed")
+
+    async def no_judgment(segments, providers, glm_key=None):
+        return {"calls": 0, "success": 0, "latencyMs": 0}
+
+    monkeypatch.setattr(service, "getGLMKey", lambda: "key")
+    monkeypatch.setattr(service, "_build_segments_via_llm", fake_plan)
+    monkeypatch.setattr(service, "buildSegmentsAligned", failing_local)
+    monkeypatch.setattr(service, "_run_llm_judgment_v2", no_judgment)
+    return asyncio.run(
+        service.detect_async(_DETECT_TEXT, "zh-CN", 400, 0, [], None, sensitivity="high", enable_dual_detection=False)
+    )
+
+
+def test_local_fallback_error_is_ignored_when_the_plan_succeeds(monkeypatch):
+    """The overlapped local segmentation only matters when the LLM plan is empty."""
+    agg, segments, _, cost, _ = _detect_with_failing_fallback(monkeypatch, plan_ok=True)
+    assert segments
+    assert cost["segmentationSource"] == "llm"
+
+
+def test_local_fallback_error_surfaces_when_it_is_needed(monkeypatch):
+    """An empty plan falls back to local segmentation, whose error then fails the detect."""
+    with pytest.raises(RuntimeError, match="local segmentation failed"):
+        _detect_with_failing_fallback(monkeypatch, plan_ok=False)
+
+
+def test_batch_planning_reuses_prepared_inputs(monkeypatch):
+    """Prepared docs are normalized once; the planner prompt uses their listing lines as given."""
+    prepares, prompts = [], []
+    real_prepare = service._prepare_detect_input
+
+    def counting_prepare(*args):
+        prepares.append(args[0])
+        return real_prepare(*args)
+
+    async def fake_call(model, key, system, user, **kwargs):
+        prompts.append(user)
+        return {"content": "{}"}
+
+    async def no_retry(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(service, "getGLMKey", lambda: "key")
+    monkeypatch.setattr(service, "callGLMChat", fake_call)
+    monkeypatch.setattr(service, "_build_segments_via_llm", no_retry)
+    monkeypatch.setattr(service, "_prepare_detect_input", counting_prepare)
+    docs = [{"text": _DETECT_TEXT, "chunkSizeTokens": 400, "overlapTokens": 0} for _ in range(2)]
+    prepared = service.prepare_batch_inputs(docs)
+    assert len(prepares) == 2
+
+    async def run():
+        return await asyncio.gather(*service.start_llm_segments_batch(docs, 2, prepared))
+
+    assert asyncio.run(run()) == [None, None]
+    assert len(prepares) == 2
+    lines = prepared[0][2]
+    assert lines and all(line in prompts[0] for line in lines)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests for the running review counters kept next to the review logs."""
+
+import copy
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.config_store import store
+from backend.app.main import api
+from backend.app.routers.history import get_review_summary, post_review_submit
+from backend.app.schemas import ReviewSubmitRequest
+
+
+# every test runs against a store rooted in its own temp dir
+pytestmark = pytest.mark.usefixtures("config_dir")
+
+
+def _submit(decision, label):
+    return post_review_submit(
+        ReviewSubmitRequest(
+            requestId="r", decision=decision, overallProbability=0.5, overallConfidence=0.5, label=label
+        )
+    )
+
+
+def test_submit_keeps_counters_in_step():
+    """Each submit updates the stored counters by one entry."""
+    _submit("flag", 1)
+    _submit("pass", 0)
+    resp = _submit("review", None)
+    assert (resp.total, resp.passCount, resp.reviewCount, resp.flagCount) == (3, 1, 1, 1)
+    summary = get_review_summary()
+    assert (summary.total, summary.labeled, summary.tp, summary.tn) == (3, 2, 1, 1)
+
+
+def test_same_length_log_edit_rebuilds_counters():
+    """Relabelling a log through the config file API must not leave the counters stale."""
+    _submit("flag", 1)
+    _submit("pass", 0)
+    logs = copy.deepcopy(store.get("review.logs"))
+    logs[0]["label"] = 0
+    resp = TestClient(api).patch("/api/config/file/review.logs", json={"value": logs})
+    assert resp.status_code == 200
+    summary = get_review_summary()
+    assert (summary.total, summary.tp, summary.fp, summary.tn) == (2, 0, 1, 1)
+    resp = _submit("pass", 1)
+    assert resp.total == 3
+    assert get_review_summary().fn == 1
+
+
+def test_submit_writes_only_the_new_entry(config_dir):
+    """A submit logs the new entry and the counters, not the whole review section."""
+    _submit("flag", 1)
+    store.checkpoint()
+    _submit("pass", 0)
+    records = [json.loads(line) for line in (config_dir / "api_config.wal").read_text(encoding="utf-8").splitlines()]
+    assert [(r["op"], r["key"]) for r in records] == [("append", "review.logs"), ("set", "review.stats")]
+    assert records[0]["value"]["decision"] == "pass"